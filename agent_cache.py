@@ -0,0 +1,96 @@
+"""
+Persistent, content-addressed cache for agent outputs.
+
+Entries are keyed by a SHA-256 of everything that determines an agent's answer (system prompt,
+input messages, a fingerprint of the data behind its tools, model deployment), so an unchanged
+stage is answered from disk on a re-run while any change to its inputs misses the cache.
+Entries are dropped max_age_days after they were written, however often they are read, and the
+least recently read ones are evicted once the cache grows beyond max_bytes. An entry file is never
+modified after it is written, so its mtime is its write time; reads only bump its atime, which
+orders the LRU eviction.
+"""
+import os
+import json
+import time
+import hashlib
+
+AGENT_CACHE_DIR = '.agent_cache'
+AGENT_CACHE_MAX_AGE_DAYS = float(os.environ.get('AGENT_CACHE_MAX_AGE_DAYS', '14'))
+AGENT_CACHE_MAX_BYTES = int(os.environ.get('AGENT_CACHE_MAX_BYTES', str(50 * 2**20)))
+
+
+class AgentCache:
+    def __init__(self, directory=AGENT_CACHE_DIR, max_age_days=AGENT_CACHE_MAX_AGE_DAYS,
+                 max_bytes=AGENT_CACHE_MAX_BYTES, enabled=True):
+        self.directory = directory
+        self.max_age_s = max_age_days * 86400
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Hashes any JSON-serializable parts into a cache key."""
+        payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        """Returns the stored output for key, or None on a miss, an expired entry or when disabled."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry['created'] > self.max_age_s:
+                os.remove(path)
+                return None
+            # Mark the entry as read for LRU eviction; the mtime keeps the write time.
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+        return entry['output']
+
+    def put(self, key, output):
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f'{self._path(key)}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.time(), 'output': output}, f)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Drops expired entries (by write time), then the least recently read ones until the cache fits in max_bytes."""
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age_s:
+                os.remove(path)
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
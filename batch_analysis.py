@@ -0,0 +1,122 @@
+"""
+Batch mode for producing the brand-level analysis for several report configurations at once.
+
+The source extract is read and prepared once, partitioned by retailer and supercategory with a
+single groupby, and the analysis is computed per configuration (optionally across a process pool).
+Each configuration is then served by tools bound to it via `make_tools`, so the same agents can
+run against any retailer / supercategory / brand owner combination without re-reading the data.
+
+Usage:
+    python batch_analysis.py batch_configs.json --processes 4 --output-dir batch_output
+
+where batch_configs.json is a list of objects such as
+    {"name": "amazon_pet", "retailer_id": 1, "supercategories": ["Total Pet"], "brand_owners": ["POST HOLDINGS INC"]}
+"""
+import os
+import json
+import argparse
+from typing import List, NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from brand_analysis_tools import (
+    FOCUS_BRAND_OWNER,
+    _build_brand_level_analysis_df,
+    _prepare_rows,
+    _read_source_rows,
+    make_tools,
+)
+
+
+class ReportConfig(NamedTuple):
+    name: str
+    retailer_id: int
+    supercategories: List[str]  # Empty means every supercategory at the retailer
+    brand_owners: List[str]
+
+
+def load_configs(path: str) -> List[ReportConfig]:
+    """Reads report configurations from a JSON list; brand_owners defaults to FOCUS_BRAND_OWNER."""
+    with open(path, encoding='utf-8') as f:
+        raw_configs = json.load(f)
+    return [
+        ReportConfig(
+            name=raw['name'],
+            retailer_id=raw['retailer_id'],
+            supercategories=list(raw.get('supercategories') or []),
+            brand_owners=list(raw.get('brand_owners') or FOCUS_BRAND_OWNER),
+        )
+        for raw in raw_configs
+    ]
+
+
+def partition_source(configs: List[ReportConfig]):
+    """
+    Reads the source once for the union of the configurations' retailers and supercategories and
+    returns {(Retailer ID, PCB_Supercategory): prepared rows}.
+    """
+    retailer_ids = sorted({config.retailer_id for config in configs})
+    # A configuration without supercategories needs every supercategory, so the read cannot filter on them.
+    if all(config.supercategories for config in configs):
+        supercategories = sorted({sc for config in configs for sc in config.supercategories})
+    else:
+        supercategories = []
+
+    df = _read_source_rows(retailer_ids, supercategories)
+    if df is None:
+        return {}
+    df = _prepare_rows(df, retailer_ids, supercategories)
+    return dict(tuple(df.groupby(['Retailer ID', 'PCB_Supercategory'], observed=True)))
+
+
+def _config_rows(config: ReportConfig, partitions):
+    parts = [
+        part for (retailer_id, supercategory), part in partitions.items()
+        if retailer_id == config.retailer_id and (not config.supercategories or supercategory in config.supercategories)
+    ]
+    return pd.concat(parts) if parts else pd.DataFrame()
+
+
+def run_batch(configs: List[ReportConfig], processes: int = None):
+    """
+    Computes the brand-level analysis for every configuration from a single source read.
+    Returns {config name: {'config', 'df', 'tools'}}, where 'tools' are bound to that configuration.
+    With processes > 1 the per-configuration builds run in a process pool.
+    """
+    partitions = partition_source(configs)
+    frames = [_config_rows(config, partitions) for config in configs]
+
+    if processes and processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            analyses = list(executor.map(_build_brand_level_analysis_df, frames))
+    else:
+        analyses = [_build_brand_level_analysis_df(frame) for frame in frames]
+
+    return {
+        config.name: {'config': config, 'df': analysis_df, 'tools': make_tools(analysis_df, config.brand_owners)}
+        for config, analysis_df in zip(configs, analyses)
+    }
+
+
+def save_batch(results, output_dir: str):
+    """Writes each configuration's analysis frame and summary tool outputs to output_dir/<name>/."""
+    for name, result in results.items():
+        config_dir = os.path.join(output_dir, name)
+        os.makedirs(config_dir, exist_ok=True)
+        result['df'].to_csv(os.path.join(config_dir, 'brand_level_analysis.csv'), index=False)
+        tools = {t.name: t for t in result['tools']}
+        for tool_name in ['get_category_health', 'get_performance_and_contribution_summary', 'get_all_focus_brand_diagnostics']:
+            with open(os.path.join(config_dir, f'{tool_name}.json'), 'w', encoding='utf-8') as f:
+                f.write(tools[tool_name].invoke({}))
+        print(f"--- Saved {name} ({len(result['df']):,} brand rows) to {config_dir} ---")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute the brand-level analysis for several report configurations from one source read.")
+    parser.add_argument('config_file', help="JSON list of report configurations")
+    parser.add_argument('--processes', type=int, default=None, help="Build the analyses in a process pool of this size")
+    parser.add_argument('--output-dir', default='batch_output', help="Directory for the per-configuration outputs")
+    args = parser.parse_args()
+
+    save_batch(run_batch(load_configs(args.config_file), processes=args.processes), args.output_dir)
@@ -0,0 +1,210 @@
+"""
+Benchmark harness for the pandas side of the pipeline.
+
+For each scale it writes a synthetic stackline_sales.csv into a scratch directory, then times
+_load_and_prepare_data, the brand-level analysis build and each of the three tools, reporting
+throughput and peak traced memory per stage. Use it to get a baseline before and after a change.
+With --payloads it also reports, per tool and payload format (verbose / compact), the output size
+and the time spent building the payload and in json.dumps. With --memory it compares the default
+and MEMORY_OPTIMIZED representations: footprint of the prepared rows and the analysis frame, build
+time, peak traced memory and the weekly groupby time.
+
+Usage:
+    python benchmark.py --scales small,medium --repeat 5 --json bench_results.json
+    python benchmark.py --scales medium --payloads
+    python benchmark.py --scales medium,large --memory
+"""
+import os
+import gc
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import pandas as pd
+
+import brand_analysis_tools as bat
+from synthetic_stackline import write_stackline_csv
+
+SCALES = {
+    'small': dict(brands=40, categories=8, retailers=1, weeks=104),
+    'medium': dict(brands=300, categories=16, retailers=2, weeks=156),
+    'large': dict(brands=2000, categories=30, retailers=3, weeks=156),
+}
+
+
+def _measure(func, repeat=1):
+    """
+    Runs func `repeat` times untraced for timing, then once under tracemalloc for memory.
+    Returns (result, mean seconds, peak traced MiB).
+    """
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def run_scale(name, params, repeat=3, verify=False, payloads=False, memory=False):
+    """Benchmarks one scale inside a scratch directory and returns one result dict per stage."""
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)
+        try:
+            raw_rows = write_stackline_csv(bat.DATA_FILE, **params)
+            bat.clear_cache()
+
+            def record(stage, func, unit_count, unit, stage_repeat=1):
+                result, seconds, peak_mib = _measure(func, stage_repeat)
+                results.append({
+                    'scale': name, 'stage': stage, 'seconds': seconds,
+                    'throughput': unit_count / seconds if seconds else float('inf'), 'unit': unit,
+                    'peak_mib': peak_mib, 'raw_rows': raw_rows,
+                })
+                return result
+
+            def cold_load():
+                bat.clear_cache()
+                return bat._load_and_prepare_data()
+
+            df = record('_load_and_prepare_data', cold_load, raw_rows, 'raw rows/s')
+            analysis_df = record('_get_brand_level_analysis_df', lambda: bat._build_brand_level_analysis_df(df), len(df), 'rows/s', repeat)
+            bat.warm_cache()
+            if verify:
+                most_recent_date = df['Week Ending'].max()
+                record('_periods_from_weekly (engine)', lambda: bat._periods_from_weekly(bat._weekly_brand_aggregates(df), most_recent_date), len(df), 'rows/s', repeat)
+                record('_periods_by_filter (reference)', lambda: bat._periods_by_filter(df, most_recent_date), len(df), 'rows/s', repeat)
+                _check_equivalence(df, most_recent_date)
+
+            record('get_category_health', lambda: bat.get_category_health.invoke({}), repeat, 'calls/s', repeat)
+            record('get_performance_and_contribution_summary', lambda: bat.get_performance_and_contribution_summary.invoke({}), repeat, 'calls/s', repeat)
+            focus_pairs = bat._get_analysis_index()['focus_pairs']
+            if focus_pairs:
+                brand, category = focus_pairs[0]
+                record('get_brand_and_competitor_diagnostics',
+                       lambda: bat.get_brand_and_competitor_diagnostics.invoke({'brand': brand, 'category': category}),
+                       repeat, 'calls/s', repeat)
+                record(f'diagnostics, one call per {len(focus_pairs)} focus pairs',
+                       lambda: [bat.get_brand_and_competitor_diagnostics.invoke({'brand': b, 'category': c}) for b, c in focus_pairs],
+                       repeat, 'loops/s', repeat)
+                record('get_all_focus_brand_diagnostics', lambda: bat.get_all_focus_brand_diagnostics.invoke({}), repeat, 'calls/s', repeat)
+            if memory:
+                results.extend(_memory_results(name, raw_rows, repeat))
+            if payloads:
+                results.extend(_payload_results(name, raw_rows, bat._get_brand_level_analysis_df(), bat._get_analysis_index(), repeat))
+            print(f"--- {name}: {raw_rows:,} raw rows, {len(df):,} focus rows, {len(analysis_df):,} brand rows ---")
+        finally:
+            bat.clear_cache()
+            os.chdir(cwd)
+    return results
+
+
+def _check_equivalence(df, most_recent_date):
+    """Asserts the period engine matches the per-period filter implementation on this data."""
+    engine = bat._periods_from_weekly(bat._weekly_brand_aggregates(df), most_recent_date)
+    reference = bat._periods_by_filter(df, most_recent_date)
+    pd.testing.assert_frame_equal(engine, reference, check_exact=False)
+
+
+def _payload_results(name, raw_rows, analysis_df, index, repeat):
+    """Times payload building and json.dumps separately for each tool in both formats and records the output size."""
+    builders = {
+        'get_category_health': lambda compact: bat._category_health_payload(analysis_df, compact),
+        'get_performance_and_contribution_summary': lambda compact: bat._performance_summary_payload(analysis_df, bat.FOCUS_BRAND_OWNER, compact),
+    }
+    if index['focus_pairs']:
+        brand, category = index['focus_pairs'][0]
+        builders['get_brand_and_competitor_diagnostics'] = lambda compact: bat._diagnostics_payload(index, brand, category, compact)
+        builders['get_all_focus_brand_diagnostics'] = lambda compact: bat._all_focus_diagnostics_payload(index, compact)
+
+    results = []
+    for tool_name, build in builders.items():
+        for compact in (False, True):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                payload = build(compact)
+            build_s = (time.perf_counter() - start) / repeat
+            start = time.perf_counter()
+            for _ in range(repeat):
+                encoded = bat._encode(payload, compact)
+            results.append({
+                'scale': name, 'stage': f"{tool_name} payload", 'format': 'compact' if compact else 'verbose',
+                'build_seconds': build_s, 'dumps_seconds': (time.perf_counter() - start) / repeat,
+                'chars': len(encoded), 'raw_rows': raw_rows,
+            })
+    return results
+
+
+def _frame_mib(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def _memory_results(name, raw_rows, repeat):
+    """Loads and builds the analysis with MEMORY_OPTIMIZED off and on, recording each representation's footprint."""
+    results = []
+    default_mode = bat.MEMORY_OPTIMIZED
+    try:
+        for optimized in (False, True):
+            bat.MEMORY_OPTIMIZED = optimized
+
+            def cold_build():
+                bat.clear_cache()
+                return bat._load_and_prepare_data(), bat._get_brand_level_analysis_df()
+
+            (df, analysis_df), seconds, peak_mib = _measure(cold_build)
+            _, groupby_seconds, _ = _measure(lambda: bat._weekly_brand_aggregates(df), repeat)
+            results.append({
+                'scale': name, 'stage': 'load + analysis build', 'mode': 'optimized' if optimized else 'default',
+                'rows_mib': _frame_mib(df), 'analysis_mib': _frame_mib(analysis_df), 'analysis_columns': analysis_df.shape[1],
+                'seconds': seconds, 'groupby_seconds': groupby_seconds, 'peak_mib': peak_mib, 'raw_rows': raw_rows,
+            })
+    finally:
+        bat.MEMORY_OPTIMIZED = default_mode
+        bat.clear_cache()
+    return results
+
+
+def print_results(results):
+    stage_results = [r for r in results if 'format' not in r and 'mode' not in r]
+    payload_results = [r for r in results if 'format' in r]
+    memory_results = [r for r in results if 'mode' in r]
+    print(f"\n{'scale':<8} {'stage':<42} {'seconds':>10} {'throughput':>22} {'peak MiB':>10}")
+    for r in stage_results:
+        print(f"{r['scale']:<8} {r['stage']:<42} {r['seconds']:>10.4f} {r['throughput']:>12,.0f} {r['unit']:<9} {r['peak_mib']:>10.1f}")
+    if memory_results:
+        print(f"\n{'scale':<8} {'mode':<10} {'rows MiB':>9} {'analysis MiB':>13} {'columns':>8} {'build s':>8} {'groupby s':>10} {'peak MiB':>9}")
+        for r in memory_results:
+            print(f"{r['scale']:<8} {r['mode']:<10} {r['rows_mib']:>9.1f} {r['analysis_mib']:>13.2f} {r['analysis_columns']:>8} "
+                  f"{r['seconds']:>8.3f} {r['groupby_seconds']:>10.4f} {r['peak_mib']:>9.1f}")
+    if payload_results:
+        print(f"\n{'scale':<8} {'tool payload':<50} {'format':<8} {'chars':>9} {'build ms':>9} {'dumps ms':>9}")
+        for r in payload_results:
+            print(f"{r['scale']:<8} {r['stage']:<50} {r['format']:<8} {r['chars']:>9,} {r['build_seconds'] * 1000:>9.2f} {r['dumps_seconds'] * 1000:>9.3f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark data loading, analysis and tools on synthetic data.")
+    parser.add_argument('--scales', default='small,medium', help=f"Comma-separated subset of {', '.join(SCALES)}")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs averaged for the analysis build and each tool")
+    parser.add_argument('--verify', action='store_true', help="Also time the reference period implementation and check the engine matches it")
+    parser.add_argument('--payloads', action='store_true', help="Also report tool payload size and json.dumps time in verbose and compact formats")
+    parser.add_argument('--memory', action='store_true', help="Also compare the footprint of the default and MEMORY_OPTIMIZED representations")
+    parser.add_argument('--json', help="Write the results to this file as JSON")
+    args = parser.parse_args()
+
+    all_results = []
+    for scale in args.scales.split(','):
+        all_results.extend(run_scale(scale, SCALES[scale], repeat=args.repeat, verify=args.verify, payloads=args.payloads, memory=args.memory))
+    print_results(all_results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, indent=2)
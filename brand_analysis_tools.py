@@ -1,89 +1,722 @@
+import os
+import asyncio
+import functools
+import threading
 import pandas as pd
 import numpy as np
 import json
 from datetime import timedelta
-from langchain.tools import tool
+from langchain.tools import StructuredTool, tool
 
 # --- Constants (can be used by tools) ---
 FOCUS_RETAILER_ID = 1
 FOCUS_BRAND_OWNER = ['POST HOLDINGS INC']
 FOCUS_SUPERCATEGORY = ['Total Pet']
 COMPETITOR_CONTRIBUTION_THRESHOLD = 0.05 # Competitor must contribute >5% of category change
+COMPETITOR_TOP_N = 5 # Competitors listed per category in the diagnostics tool
 
-# --- In-memory cache for the dataframe ---
+# --- Tool payload format ---
+# Compact payloads are header-plus-rows tables of rounded numbers instead of pre-formatted strings.
+COMPACT_TOOL_OUTPUT = os.environ.get('COMPACT_TOOL_OUTPUT', '').lower() in ('1', 'true', 'yes')
+COMPACT_SIG_FIGS = 3
+# Optional row caps per compact table (None = no cap), to keep a full run within a token budget.
+COMPACT_ROW_LIMITS = {'focus_brand_summary': None, 'competitor_summary': None, 'competitor_details': None}
+DATA_FILE = 'stackline_sales.csv'
+SNAPSHOT_FILE = 'stackline_sales.parquet' # Typed columnar copy of DATA_FILE, see build_snapshot()
+WEEKLY_STORE_FILE = 'weekly_brand_aggregates.pkl' # Persisted weekly aggregates and rolling period totals, see build_weekly_store()
+ANALYSIS_ARTIFACT_FILE = 'brand_level_analysis.arrow' # Precomputed analysis frame + metadata, see precompute_analysis.py
+ANALYSIS_ARTIFACT_VERSION = 2 # Bump when the frame layout changes so older artifacts are rebuilt
+STREAM_CHUNK_ROWS = None # Set (e.g. 1_000_000) to aggregate DATA_FILE in chunks of this many rows instead of loading it whole
+# Keep the prepared rows as categorical keys and float32 metrics, and add only the derived columns the
+# tools read (TOOL_DERIVED_COLUMNS) to the analysis frame. See benchmark.py --memory for the footprint.
+MEMORY_OPTIMIZED = os.environ.get('MEMORY_OPTIMIZED', '').lower() in ('1', 'true', 'yes')
+
+# --- Aggregation layout shared by the period engine ---
+GROUP_KEYS = ['Brand Owner', 'Brand', 'PCB_Category', 'PCB_Supercategory']
+AGG_COLS = {'Retail Sales': 'sum', 'Units Sold': 'sum', 'In-Stock Rate': 'mean', 'Weeks On-Hand': 'mean', 'Buy Box - Rate': 'mean', 'Total Traffic': 'sum', 'Paid Ad Spend': 'sum', 'Retail Price': 'mean'}
+MEAN_COLS = [col for col, how in AGG_COLS.items() if how == 'mean']
+# Additive quantities kept per brand and week (and per period), from which every period metric can be rebuilt.
+WEEKLY_QUANTITIES = list(AGG_COLS) + [f'{col} Count' for col in MEAN_COLS] + ['Weeks']
+# Period name -> (weeks back to the first Week Ending, weeks back to the last Week Ending), both inclusive.
+PERIOD_WINDOWS = {
+    'L1': (0, 0), 'P1': (1, 1), 'Y1': (52, 52),
+    'L4': (3, 0), 'P4': (7, 4), 'Y4': (55, 52), 'PP4': (11, 8),
+    'L13': (12, 0), 'P13': (25, 13), 'Y13': (64, 52),
+    'L26': (25, 0), 'P26': (51, 26), 'Y26': (77, 52),
+}
+# The only source columns the analysis reads; everything else in the extract is skipped at load time.
+SOURCE_COLUMNS = ['Week Ending', 'Retailer ID', 'Organic Traffic'] + GROUP_KEYS + list(AGG_COLS)
+# Derived analysis columns read by the tools; the rest of _add_derived_columns' output is only for ad-hoc use.
+TOOL_DERIVED_COLUMNS = frozenset(
+    [f'L{p}_vs_P{p}_Sales_Abs_Chg' for p in ['1', '4', '13', '26']]
+    + ['L4_vs_Y4_Sales_Abs_Chg', 'P4_vs_PP4_Sales_Abs_Chg', 'L4_vs_P4_Sales_Pct_Chg', 'L4_vs_Y4_Sales_Pct_Chg', 'Contribution_To_Cat_Chg']
+    + [f'{metric}_L{p}_vs_{t}{p}_Pct_Chg' for metric in ['Total_Traffic', 'Paid_Ad_Spend', 'Buy_Box_-_Rate'] for p in ['4', '13', '26'] for t in 'PY']
+    + [f'L{p}_{effect}' for p in ['4', '13', '26'] for effect in ['Price_Effect', 'Volume_Effect', 'Price_Effect_Pct_of_Chg', 'Volume_Effect_Pct_of_Chg']]
+)
+# Derived columns always computed because other derived columns depend on them.
+_DERIVED_INTERMEDIATES = [f'L{p}_vs_{t}{p}_Sales_Abs_Chg' for p in ['1', '4', '13', '26'] for t in 'PY'] + \
+    [f'L{p}_{effect}' for p in ['4', '13', '26'] for effect in ['Price_Effect', 'Volume_Effect']]
+
+# --- In-memory caches for the dataframes ---
+# Both caches are keyed by the source file's identity (path, mtime, size) and the focus
+# constants, so editing the CSV or the constants invalidates them on the next call. The analysis
+# cache also tracks the weekly store and the precomputed artifact, so rewriting either is picked up.
 _df_cache = None
+_df_cache_key = None
+_analysis_cache = {}
+# Tools may be called from concurrent analyst workers; builds happen once, under this lock.
+_cache_lock = threading.RLock()
+
+def _source_signature(path=DATA_FILE):
+    """Returns (absolute path, mtime, size) for the source file, or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def _snapshot_is_fresh(snapshot_path=SNAPSHOT_FILE, csv_path=DATA_FILE):
+    """True when the snapshot exists and is at least as new as the CSV it was built from."""
+    snapshot = _source_signature(snapshot_path)
+    if snapshot is None:
+        return False
+    source = _source_signature(csv_path)
+    return source is None or snapshot[1] >= source[1]
+
+def _cache_key():
+    """Key shared by the prepared and brand-level caches: source identity plus the filtering constants and memory mode."""
+    source_path = SNAPSHOT_FILE if _snapshot_is_fresh() else DATA_FILE
+    return (_source_signature(source_path), FOCUS_RETAILER_ID, tuple(FOCUS_SUPERCATEGORY or ()), MEMORY_OPTIMIZED)
+
+def _analysis_key():
+    """Key of the cached analysis record: _cache_key plus the weekly store and precomputed artifact it may come from."""
+    return _cache_key() + (_source_signature(WEEKLY_STORE_FILE), _source_signature(ANALYSIS_ARTIFACT_FILE))
+
+def analysis_fingerprint():
+    """
+    Identifies what every tool answers from: source identity, weekly store, precomputed artifact,
+    all focus constants and the payload format settings. Equal fingerprints mean the tools return
+    the same outputs for the same arguments.
+    """
+    return repr(_analysis_key() + (tuple(FOCUS_BRAND_OWNER),
+                                COMPETITOR_CONTRIBUTION_THRESHOLD, COMPETITOR_TOP_N,
+                                COMPACT_TOOL_OUTPUT, COMPACT_SIG_FIGS, tuple(sorted(COMPACT_ROW_LIMITS.items()))))
+
+def clear_cache():
+    """Drops the prepared and brand-level frames so the next tool call rebuilds them from the source file."""
+    global _df_cache, _df_cache_key
+    with _cache_lock:
+        _df_cache = None
+        _df_cache_key = None
+        _analysis_cache.clear()
+
+def warm_cache():
+    """Builds (or refreshes) the cached brand-level frame ahead of the first tool call and returns it."""
+    return _get_brand_level_analysis_df()
+
+async def awarm_cache():
+    """warm_cache on a worker thread, so the build can overlap with LLM calls on the event loop."""
+    return await asyncio.to_thread(warm_cache)
 
 def _load_and_prepare_data():
     """Loads and prepares the base dataframe."""
-    global _df_cache
-    if _df_cache is not None:
+    global _df_cache, _df_cache_key
+    with _cache_lock:
+        key = _cache_key()
+        if _df_cache is not None and _df_cache_key == key:
+            return _df_cache
+
+        df = _read_source_rows([FOCUS_RETAILER_ID], FOCUS_SUPERCATEGORY)
+        if df is None:
+            return pd.DataFrame()
+
+        _df_cache = _prepare_rows(df)
+        _df_cache_key = key
         return _df_cache
-    
-    try:
-        df = pd.read_csv('stackline_sales.csv')
-    except FileNotFoundError:
-        print("WARNING: 'stackline_sales.csv' not found. Cannot proceed.")
-        return pd.DataFrame()
-    
+
+def _read_source_rows(retailer_ids, supercategories):
+    """
+    Reads the analysis columns for the given retailers/supercategories from the snapshot when it is
+    fresh, otherwise from the CSV (where the filters are applied later by _prepare_rows).
+    Returns None when no source file exists.
+    """
+    df = _read_snapshot(retailer_ids=retailer_ids, supercategories=supercategories) if _snapshot_is_fresh() else None
+    if df is None:
+        try:
+            # In memory-optimized mode the keys are parsed straight into categoricals, never as object strings.
+            dtype = _compact_dtypes() if MEMORY_OPTIMIZED else None
+            df = pd.read_csv(DATA_FILE, usecols=lambda col: col in SOURCE_COLUMNS, dtype=dtype)
+        except FileNotFoundError:
+            print("WARNING: 'stackline_sales.csv' not found. Cannot proceed.")
+            return None
+    return df
+
+def _prepare_rows(df, retailer_ids=None, supercategories=None):
+    """
+    Parses dates and applies the Organic Traffic dropna and the retailer/supercategory filters,
+    which default to FOCUS_RETAILER_ID and FOCUS_SUPERCATEGORY.
+    """
+    retailer_ids = [FOCUS_RETAILER_ID] if retailer_ids is None else retailer_ids
+    supercategories = FOCUS_SUPERCATEGORY if supercategories is None else supercategories
+    # Apply initial filters as one mask so the surviving rows are copied only once
+    mask = df['Organic Traffic'].notna() & df['Retailer ID'].isin(retailer_ids)
+    if supercategories and 'PCB_Supercategory' in df.columns:
+        mask &= df['PCB_Supercategory'].isin(supercategories)
+    df = df[mask].copy()
     df['Week Ending'] = pd.to_datetime(df['Week Ending'])
-    df = df.dropna(subset=['Organic Traffic'])
-    
-    # Apply initial filters
-    df = df[df['Retailer ID'] == FOCUS_RETAILER_ID].copy()
-    if FOCUS_SUPERCATEGORY and 'PCB_Supercategory' in df.columns:
-        df = df[df['PCB_Supercategory'].isin(FOCUS_SUPERCATEGORY)].copy()
+    return _compact_rows(df) if MEMORY_OPTIMIZED else df
+
+def _compact_dtypes():
+    return {**{col: 'category' for col in GROUP_KEYS}, **{col: 'float32' for col in list(AGG_COLS) + ['Organic Traffic']}}
+
+def _compact_rows(df):
+    """
+    Memory-optimized copy of prepared rows: categorical keys, float32 metrics, the smallest integer
+    type for Retailer ID, and no Organic Traffic (only needed for the dropna).
+    """
+    df = df.drop(columns=['Organic Traffic'], errors='ignore')
+    df = df.astype({col: dtype for col, dtype in _compact_dtypes().items() if col in df.columns})
+    for col in GROUP_KEYS:
+        # Filtering leaves unused categories behind; drop them so groupbys only see present values.
+        if col in df.columns:
+            df[col] = df[col].cat.remove_unused_categories()
+    if 'Retailer ID' in df.columns:
+        df['Retailer ID'] = pd.to_numeric(df['Retailer ID'], downcast='integer')
+    return df
+
+def build_snapshot(csv_path=DATA_FILE, snapshot_path=SNAPSHOT_FILE):
+    """
+    Converts the CSV extract into a typed Parquet snapshot: categorical keys, float32 metrics and a
+    native date column, sorted by retailer and supercategory so the loader's filters can skip row
+    groups. Run once after each data drop; the loader prefers the snapshot while it is fresh.
+    """
+    df = pd.read_csv(csv_path, usecols=lambda col: col in SOURCE_COLUMNS)
+    df['Week Ending'] = pd.to_datetime(df['Week Ending'])
+    for col in GROUP_KEYS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in list(AGG_COLS) + ['Organic Traffic']:
+        if col in df.columns:
+            df[col] = df[col].astype('float32')
+    sort_cols = [col for col in ['Retailer ID', 'PCB_Supercategory', 'Week Ending'] if col in df.columns]
+    df = df.sort_values(sort_cols, ignore_index=True)
+    df.to_parquet(snapshot_path, index=False, row_group_size=100_000)
+    print(f"--- Saved snapshot of {len(df):,} rows to {snapshot_path} ---")
+    return snapshot_path
 
-    _df_cache = df.copy()
-    return _df_cache
+def _read_snapshot(snapshot_path=SNAPSHOT_FILE, retailer_ids=None, supercategories=None):
+    """
+    Reads the analysis columns from the Parquet snapshot with the retailer and supercategory filters
+    (FOCUS_RETAILER_ID / FOCUS_SUPERCATEGORY by default) pushed down into the read. Returns None when
+    pyarrow is unavailable so the caller falls back to CSV.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("WARNING: pyarrow is not installed; reading the CSV instead of the snapshot.")
+        return None
+
+    retailer_ids = [FOCUS_RETAILER_ID] if retailer_ids is None else retailer_ids
+    supercategories = FOCUS_SUPERCATEGORY if supercategories is None else supercategories
+    available = set(pq.read_schema(snapshot_path).names)
+    filters = [('Retailer ID', 'in', list(retailer_ids))]
+    if supercategories and 'PCB_Supercategory' in available:
+        filters.append(('PCB_Supercategory', 'in', list(supercategories)))
+    df = pd.read_parquet(snapshot_path, columns=[col for col in SOURCE_COLUMNS if col in available], filters=filters)
+    # Metrics are stored as float32 to keep the file small; aggregate them at full precision
+    # unless the memory-optimized mode keeps them as they are.
+    if not MEMORY_OPTIMIZED:
+        metric_cols = [col for col in AGG_COLS if col in df.columns]
+        df[metric_cols] = df[metric_cols].astype('float64')
+    return df
 
 def _get_brand_level_analysis_df():
+    """
+    Returns the brand-level analysis frame, building it only when the source file or the
+    focus constants have changed since the last call. Callers must treat the result as read-only.
+    """
+    return _get_analysis()['df']
+
+def _get_analysis():
+    """
+    Returns the cached analysis record: the brand-level frame, its most recent Week Ending and
+    lazily built lookups over it. A fresh precomputed artifact is used instead of building the frame.
+    """
+    with _cache_lock:
+        key = _analysis_key()
+        if key in _analysis_cache:
+            return _analysis_cache[key]
+
+        analysis = _load_analysis_artifact()
+        if analysis is None:
+            analysis = _build_analysis()
+        # Only the current source signature is worth keeping around.
+        _analysis_cache.clear()
+        _analysis_cache[key] = analysis
+        return analysis
+
+def _build_analysis():
+    """Builds the analysis record from the source (or the weekly store), bypassing every cache."""
+    store = _load_weekly_store()
+    if STREAM_CHUNK_ROWS:
+        pivot_df, most_recent_date = _build_brand_level_analysis_df_streaming(DATA_FILE, STREAM_CHUNK_ROWS, store)
+    else:
+        df = _load_and_prepare_data()
+        if store is None or df.empty:
+            pivot_df = _build_brand_level_analysis_df(df)
+            most_recent_date = df['Week Ending'].max() if not df.empty else None
+        else:
+            # Only weeks newer than the store are aggregated; the rest comes from the persisted totals.
+            store = _append_weeks(store, df)
+            pivot_df = _add_derived_columns(_periods_from_totals(store['totals']))
+            most_recent_date = store['most_recent_date']
+    return {'df': pivot_df, 'most_recent_date': most_recent_date}
+
+# --- Precomputed analysis artifact ---
+# precompute_analysis.py writes the analysis frame to an uncompressed Arrow IPC file with its
+# metadata in the schema. Agent processes memory-map it, so the tools answer without loading the
+# extract or running any aggregation, as long as the artifact matches the current source and config.
+
+def _artifact_key():
+    """What the frame depends on, in JSON form: source and store signatures, focus filters, mode and layout version."""
+    source_signature, retailer_id, supercategories, memory_optimized = _cache_key()
+    return json.loads(json.dumps([source_signature, retailer_id, supercategories, _source_signature(WEEKLY_STORE_FILE),
+                                  memory_optimized, ANALYSIS_ARTIFACT_VERSION]))
+
+def _artifact_metadata(analysis):
+    most_recent_date = analysis['most_recent_date']
+    bounds = _period_bounds(most_recent_date) if most_recent_date is not None else {}
+    return {
+        'version': ANALYSIS_ARTIFACT_VERSION,
+        'key': _artifact_key(),
+        'built_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        'most_recent_date': most_recent_date.date().isoformat() if most_recent_date is not None else None,
+        'period_bounds': {name: [start.date().isoformat(), end.date().isoformat()] for name, (start, end) in bounds.items()},
+        'focus': {'retailer_id': FOCUS_RETAILER_ID, 'supercategories': list(FOCUS_SUPERCATEGORY or []), 'brand_owners': list(FOCUS_BRAND_OWNER)},
+        'memory_optimized': MEMORY_OPTIMIZED,
+        'rows': len(analysis['df']),
+    }
+
+def build_analysis_artifact(artifact_path=ANALYSIS_ARTIFACT_FILE):
+    """
+    Builds the analysis from the current source, bypassing the caches and any existing artifact,
+    and writes it with its metadata to artifact_path. Returns the metadata.
+    """
+    import pyarrow as pa
+
+    with _cache_lock:
+        analysis = _build_analysis()
+        metadata = _artifact_metadata(analysis)
+    table = pa.Table.from_pandas(analysis['df'], preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'analysis': json.dumps(metadata).encode('utf-8')})
+    tmp_path = f'{artifact_path}.{os.getpid()}.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, artifact_path)
+    print(f"--- Saved analysis artifact ({metadata['rows']:,} brand rows, week ending {metadata['most_recent_date']}) to {artifact_path} ---")
+    return metadata
+
+def read_artifact_metadata(artifact_path=ANALYSIS_ARTIFACT_FILE):
+    """Returns the metadata stored in the artifact without reading its columns, or None if it is missing."""
+    try:
+        import pyarrow as pa
+        with pa.memory_map(artifact_path) as source:
+            schema_metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (ImportError, FileNotFoundError):
+        return None
+    return json.loads(schema_metadata.get(b'analysis', b'null'))
+
+def _artifact_is_fresh(metadata):
+    stored = (metadata or {}).get('key')
+    if stored is None:
+        return False
+    current = _artifact_key()
+    # Source files that are not deployed next to the artifact (e.g. on the agent host) do not make it stale.
+    for position in (0, 3):
+        if current[position] is None:
+            current[position] = stored[position]
+    return stored == current
+
+def _load_analysis_artifact(artifact_path=ANALYSIS_ARTIFACT_FILE):
+    """
+    Returns the analysis record from the artifact when it exists and is fresh, else None. Numeric
+    columns are zero-copy views of the memory-mapped file, which is why the frame is read-only.
+    """
+    metadata = read_artifact_metadata(artifact_path)
+    if not _artifact_is_fresh(metadata):
+        return None
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(artifact_path)).read_all()
+    most_recent_date = metadata['most_recent_date']
+    return {
+        'df': table.to_pandas(split_blocks=True),
+        'most_recent_date': pd.Timestamp(most_recent_date) if most_recent_date is not None else None,
+        'metadata': metadata,
+    }
+
+def _get_analysis_index():
+    """Returns the lookup index for the current analysis frame, building it on first use."""
+    with _cache_lock:
+        analysis = _get_analysis()
+        index = analysis.get('index')
+        if index is None or (index['focus_brand_owner'], index['top_n']) != (tuple(FOCUS_BRAND_OWNER), COMPETITOR_TOP_N):
+            index = analysis['index'] = _build_analysis_index(analysis['df'])
+        return index
+
+def _build_analysis_index(df, brand_owners=None, top_n=None):
+    """
+    Precomputes the lookups the diagnostics tool needs, as row positions into df:
+    'rows' maps (Brand, PCB_Category) to the brand's row, 'competitors' maps each category to its
+    top_n brands (COMPETITOR_TOP_N by default) outside brand_owners (FOCUS_BRAND_OWNER by default)
+    by absolute contribution to category change, and 'focus_pairs' lists every focus brand x category
+    combination in frame order. 'columns' holds every column the diagnostics
+    sections format as an array (zeros when the frame lacks it), so rendering them is plain array indexing.
+    """
+    brand_owners = FOCUS_BRAND_OWNER if brand_owners is None else brand_owners
+    top_n = COMPETITOR_TOP_N if top_n is None else top_n
+    index = {'focus_brand_owner': tuple(brand_owners), 'top_n': top_n, 'rows': {}, 'competitors': {}, 'focus_pairs': [], 'columns': {}}
+    if df.empty:
+        return index
+
+    # Lookups are positions into the column arrays, so a filtered frame's index labels are dropped first.
+    df = df.reset_index(drop=True)
+    index['columns'] = {name: df[name].to_numpy() if name in df.columns else np.zeros(len(df)) for name in SECTION_COLUMNS}
+
+    first_rows = df[~df.duplicated(['Brand', 'PCB_Category'])]
+    index['rows'] = dict(zip(zip(first_rows['Brand'], first_rows['PCB_Category']), first_rows.index))
+
+    is_focus = df['Brand Owner'].isin(brand_owners)
+    for category, comp_df in df[~is_focus].groupby('PCB_Category', sort=False):
+        top = comp_df.sort_values(by='Contribution_To_Cat_Chg', key=abs, ascending=False).head(top_n)
+        index['competitors'][category] = top.index.to_numpy()
+
+    focus_rows = first_rows[first_rows['Brand Owner'].isin(brand_owners)]
+    index['focus_pairs'] = list(zip(focus_rows['Brand'], focus_rows['PCB_Category']))
+    return index
+
+def _build_brand_level_analysis_df(df):
     """
     A helper function that performs the main brand-level aggregation and delta calculations.
     This prepares the data that all tools will query using a robust aggregation method.
     """
-    df = _load_and_prepare_data()
     if df.empty:
         return pd.DataFrame()
 
     most_recent_date = df['Week Ending'].max()
-    periods = {
-        'L1': (most_recent_date, most_recent_date), 'P1': (most_recent_date - timedelta(weeks=1), most_recent_date - timedelta(weeks=1)), 'Y1': (most_recent_date - timedelta(weeks=52), most_recent_date - timedelta(weeks=52)),
-        'L4': (most_recent_date - timedelta(weeks=3), most_recent_date), 'P4': (most_recent_date - timedelta(weeks=7), most_recent_date - timedelta(weeks=4)), 'Y4': (most_recent_date - timedelta(weeks=55), most_recent_date - timedelta(weeks=52)), 'PP4': (most_recent_date - timedelta(weeks=11), most_recent_date - timedelta(weeks=8)),
-        'L13': (most_recent_date - timedelta(weeks=12), most_recent_date), 'P13': (most_recent_date - timedelta(weeks=25), most_recent_date - timedelta(weeks=13)), 'Y13': (most_recent_date - timedelta(weeks=64), most_recent_date - timedelta(weeks=52)),
-        'L26': (most_recent_date - timedelta(weeks=25), most_recent_date), 'P26': (most_recent_date - timedelta(weeks=51), most_recent_date - timedelta(weeks=26)), 'Y26': (most_recent_date - timedelta(weeks=77), most_recent_date - timedelta(weeks=52)),
+    pivot_df = _periods_from_weekly(_weekly_brand_aggregates(df), most_recent_date)
+    return _add_derived_columns(pivot_df)
+
+def _build_brand_level_analysis_df_streaming(csv_path=DATA_FILE, chunk_rows=1_000_000, store=None):
+    """
+    Same frame as _build_brand_level_analysis_df, but reads the CSV chunk by chunk and only keeps
+    brand x week partial aggregates, so peak memory is bounded by brands x weeks rather than by the
+    raw row count. With a weekly store, only weeks newer than the store are aggregated.
+    Returns (frame, most recent Week Ending).
+    """
+    after = store['most_recent_date'] if store is not None else None
+    weekly, most_recent_date = _stream_weekly_aggregates(csv_path, chunk_rows, after)
+    if store is not None:
+        if weekly is not None:
+            store = _append_weekly(store, weekly, most_recent_date)
+        return _add_derived_columns(_periods_from_totals(store['totals'])), store['most_recent_date']
+    if weekly is None:
+        return pd.DataFrame(), None
+    return _add_derived_columns(_periods_from_weekly(weekly, most_recent_date)), most_recent_date
+
+def _stream_weekly_aggregates(csv_path=DATA_FILE, chunk_rows=1_000_000, after=None):
+    """
+    Folds the CSV into weekly brand aggregates one chunk at a time, applying the Organic Traffic
+    dropna and focus filters per chunk. Rows on or before `after` are skipped. Returns
+    (weekly, most recent Week Ending), or (None, None) when no row survives the filters.
+    """
+    partials = []
+    most_recent_date = None
+    try:
+        reader = pd.read_csv(csv_path, usecols=lambda col: col in SOURCE_COLUMNS, chunksize=chunk_rows)
+    except FileNotFoundError:
+        print(f"WARNING: '{csv_path}' not found. Cannot proceed.")
+        return None, None
+
+    for chunk in reader:
+        chunk = _prepare_rows(chunk)
+        if after is not None:
+            chunk = chunk[chunk['Week Ending'] > after]
+        if chunk.empty:
+            continue
+        chunk_max = chunk['Week Ending'].max()
+        most_recent_date = chunk_max if most_recent_date is None else max(most_recent_date, chunk_max)
+        partials.append(_weekly_brand_aggregates(chunk))
+        # All weekly quantities are additive, so partials can be merged at any point to bound memory.
+        if len(partials) >= 8:
+            partials = [_combine_weekly(partials)]
+
+    if not partials:
+        return None, None
+    return _combine_weekly(partials), most_recent_date
+
+def _combine_weekly(partials):
+    """Merges weekly aggregates computed over disjoint row sets."""
+    if len(partials) == 1:
+        return partials[0]
+    return pd.concat(partials).groupby(level=GROUP_KEYS + ['Week Ending'], observed=True).sum()
+
+def _period_bounds(most_recent_date):
+    """Maps each period name to its inclusive (start, end) Week Ending dates."""
+    return {
+        name: (most_recent_date - timedelta(weeks=start_back), most_recent_date - timedelta(weeks=end_back))
+        for name, (start_back, end_back) in PERIOD_WINDOWS.items()
+    }
+
+def _weekly_brand_aggregates(df):
+    """
+    Collapses the row-level data to one row per brand key and Week Ending. Every metric is
+    summed; mean metrics also carry a '<metric> Count' column of non-null rows so that period
+    means can be recovered exactly as sum / count.
+    """
+    grouped = df.groupby(GROUP_KEYS + ['Week Ending'], observed=True)
+    weekly = grouped[list(AGG_COLS)].sum()
+    counts = grouped[MEAN_COLS].count()
+    counts.columns = [f'{col} Count' for col in MEAN_COLS]
+    return pd.concat([weekly, counts], axis=1)
+
+def _periods_from_weekly(weekly, most_recent_date):
+    """Builds the wide metric x period frame from weekly aggregates."""
+    return _periods_from_totals(_period_totals_from_weekly(weekly, most_recent_date))
+
+def _period_totals_from_weekly(weekly, most_recent_date):
+    """
+    Sums the weekly aggregates into per-brand period totals in a single pass.
+
+    Each distinct week is mapped to the periods it belongs to through a week x period
+    membership matrix; per-brand period totals are then segment sums of the weekly rows
+    weighted by that matrix, instead of one boolean scan of the full frame per period.
+    The result has (quantity, period) columns, where 'Weeks' counts contributing weeks.
+    """
+    bounds = _period_bounds(most_recent_date)
+    period_names = list(bounds)
+    starts = np.array([bounds[name][0] for name in period_names], dtype='datetime64[ns]')
+    ends = np.array([bounds[name][1] for name in period_names], dtype='datetime64[ns]')
+
+    week_values = weekly.index.get_level_values('Week Ending').values.astype('datetime64[ns]')
+    membership = (week_values[:, None] >= starts) & (week_values[:, None] <= ends)
+    in_window = membership.any(axis=1)
+    weekly = weekly[in_window]
+    membership = membership[in_window]
+
+    # Weekly rows come out of the groupby sorted by brand key, so each brand is one contiguous
+    # segment; a segment starts wherever any key level's code changes.
+    key_codes = weekly.index.codes[:len(GROUP_KEYS)]
+    boundaries = np.zeros(len(weekly), dtype=bool)
+    boundaries[:1] = True
+    for codes in key_codes:
+        boundaries[1:] |= codes[1:] != codes[:-1]
+    segment_starts = np.flatnonzero(boundaries)
+    group_index = _plain_key_index(weekly.index[segment_starts])
+
+    blocks = []
+    for quantity in WEEKLY_QUANTITIES:
+        values = weekly[quantity].to_numpy(dtype='float64') if quantity != 'Weeks' else np.ones(len(weekly))
+        blocks.append(np.add.reduceat(values[:, None] * membership, segment_starts, axis=0))
+    columns = pd.MultiIndex.from_product([WEEKLY_QUANTITIES, period_names])
+    return pd.DataFrame(np.hstack(blocks), index=group_index, columns=columns)
+
+def _plain_key_index(index):
+    """Brand-key MultiIndex with categorical levels (from a typed snapshot) turned back into plain values."""
+    levels = [index.get_level_values(key) for key in GROUP_KEYS]
+    levels = [level.astype(level.categories.dtype) if isinstance(level.dtype, pd.CategoricalDtype) else level for level in levels]
+    return pd.MultiIndex.from_arrays(levels, names=GROUP_KEYS)
+
+def _periods_from_totals(totals):
+    """
+    Turns per-brand period totals into the wide frame the tools query: means are rebuilt as
+    sum / count, and brand-periods without any weeks read as 0, as with the original pivot.
+    """
+    period_names = list(PERIOD_WINDOWS)
+    totals = totals.reindex(columns=pd.MultiIndex.from_product([WEEKLY_QUANTITIES, period_names]), fill_value=0)
+    values = totals.to_numpy(dtype='float64').reshape(len(totals), len(WEEKLY_QUANTITIES), len(period_names))
+    weeks = values[:, WEEKLY_QUANTITIES.index('Weeks'), :]
+    present = (weeks > 0).any(axis=1)
+    # Brands rolled in by the weekly store are appended at the end, so restore the pivot's key order.
+    order = totals.index[present].argsort()
+    group_index = totals.index[present][order]
+    values = values[present][order]
+    weeks = weeks[present][order]
+    # A period no row falls into never shows up as a column, as with the original pivot.
+    active = np.flatnonzero((weeks > 0).any(axis=0))
+
+    columns = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for metric, how in AGG_COLS.items():
+            metric_values = values[:, WEEKLY_QUANTITIES.index(metric), :]
+            if how == 'mean':
+                counts = values[:, WEEKLY_QUANTITIES.index(f'{metric} Count'), :]
+                metric_values = np.where(counts > 0, metric_values / counts, 0.0)
+            metric_values = np.where(weeks > 0, metric_values, 0.0)
+            for i in active:
+                columns[(metric, period_names[i])] = metric_values[:, i]
+
+    ordered = sorted(columns)
+    # Standardize all column names ONCE to use underscores for consistency
+    names = [f'{metric}_{period}'.replace(' ', '_') for metric, period in ordered]
+    return pd.DataFrame(np.column_stack([columns[key] for key in ordered]), index=group_index, columns=names)
+
+# --- Incremental weekly store ---
+# The store keeps one row of additive quantities per brand key and week, plus the per-brand
+# period totals for its most recent week. A new week is folded in by adding the weeks that
+# enter each period window and subtracting the ones that leave it, so weekly refreshes never
+# re-aggregate the full history. Only build_weekly_store and ingest_weeks write the store; tool
+# calls roll the totals forward over newer source weeks in memory.
+
+def _store_config():
+    return (FOCUS_RETAILER_ID, tuple(FOCUS_SUPERCATEGORY or ()))
+
+def _load_weekly_store(store_path=WEEKLY_STORE_FILE):
+    """Returns the persisted store, or None if it is missing or was built for other focus constants."""
+    if not os.path.exists(store_path):
+        return None
+    store = pd.read_pickle(store_path)
+    if store.get('config') != _store_config():
+        print(f"WARNING: '{store_path}' was built for a different focus configuration; ignoring it.")
+        return None
+    return store
+
+def build_weekly_store(df=None, store_path=WEEKLY_STORE_FILE):
+    """Aggregates the full prepared history into a new weekly store. Rebuild after history is restated."""
+    if df is None:
+        df = _load_and_prepare_data()
+    store = _new_weekly_store(df)
+    pd.to_pickle(store, store_path)
+    return store
+
+def _new_weekly_store(df):
+    weekly = _weekly_brand_aggregates(df)
+    most_recent_date = df['Week Ending'].max()
+    return {
+        'config': _store_config(),
+        'most_recent_date': most_recent_date,
+        'weekly': weekly,
+        'totals': _period_totals_from_weekly(weekly, most_recent_date),
+    }
+
+def ingest_weeks(rows, store_path=WEEKLY_STORE_FILE):
+    """
+    Folds raw extract rows into the store. Only weeks newer than the store's most recent week are
+    used; earlier rows are ignored, so a full extract and a single-week file both work. Without a
+    store, it is first built from the full source history (never from rows alone, which may hold a
+    single week).
+    """
+    rows = _prepare_rows(rows)
+    store = _load_weekly_store(store_path)
+    if store is None:
+        history = _load_and_prepare_data()
+        if history.empty:
+            raise ValueError(f"No weekly store at '{store_path}' and no source history to build it from; run build_weekly_store() on the full extract first.")
+        store = _new_weekly_store(history)
+        appended = _append_weeks(store, rows)
+    else:
+        appended = _append_weeks(store, rows)
+        if appended is store:
+            return store
+    pd.to_pickle(appended, store_path)
+    return appended
+
+def _append_weeks(store, rows):
+    """Returns the store with the rows newer than its most recent week folded in (or store itself if there are none)."""
+    new_rows = rows[rows['Week Ending'] > store['most_recent_date']]
+    if new_rows.empty:
+        return store
+
+    return _append_weekly(store, _weekly_brand_aggregates(new_rows), new_rows['Week Ending'].max())
+
+def _append_weekly(store, new_weekly, new_date):
+    """
+    Returns a new store with weekly aggregates for weeks after the store's most recent week appended
+    and the totals rolled to new_date. Nothing is written to disk.
+    """
+    weekly = pd.concat([store['weekly'], new_weekly])
+    return {
+        'config': store['config'],
+        'most_recent_date': new_date,
+        'weekly': weekly,
+        'totals': _roll_period_totals(store['totals'], weekly, store['most_recent_date'], new_date),
     }
 
+def _sum_by_brand(weekly):
+    return weekly.assign(Weeks=1.0)[WEEKLY_QUANTITIES].groupby(level=GROUP_KEYS, observed=True).sum()
+
+def _roll_period_totals(totals, weekly, old_date, new_date):
+    """Moves every period window from old_date to new_date by adding entering weeks and subtracting leaving ones."""
+    old_bounds = _period_bounds(old_date)
+    new_bounds = _period_bounds(new_date)
+    week_values = weekly.index.get_level_values('Week Ending')
+
+    rolled = {}
+    for period in PERIOD_WINDOWS:
+        old_start, old_end = old_bounds[period]
+        new_start, new_end = new_bounds[period]
+        entering = (week_values > old_end) & (week_values >= new_start) & (week_values <= new_end)
+        leaving = (week_values >= old_start) & (week_values <= old_end) & (week_values < new_start)
+        change = _sum_by_brand(weekly[entering]).sub(_sum_by_brand(weekly[leaving]), fill_value=0)
+        rolled[period] = totals.xs(period, axis=1, level=1).add(change, fill_value=0)
+
+    rolled = pd.concat(rolled, axis=1).swaplevel(axis=1).fillna(0)
+    rolled = rolled[[(quantity, period) for quantity in WEEKLY_QUANTITIES for period in PERIOD_WINDOWS]]
+    # Clear subtraction residue for brand-periods that no longer hold any week, and drop brands
+    # that have left every window.
+    empty = (rolled['Weeks'] <= 0).to_numpy()
+    for quantity in WEEKLY_QUANTITIES:
+        rolled[quantity] = rolled[quantity].mask(empty, 0.0)
+    return rolled[(rolled['Weeks'] > 0).any(axis=1)]
+
+def _periods_by_filter(df, most_recent_date):
+    """
+    Reference implementation of _periods_from_weekly: one boolean date scan and groupby per
+    period followed by a long-format pivot. Kept for equivalence checks against the engine.
+    """
     all_periods_agg = []
-    agg_cols = {'Retail Sales': 'sum', 'Units Sold': 'sum', 'In-Stock Rate': 'mean', 'Weeks On-Hand': 'mean', 'Buy Box - Rate': 'mean', 'Total Traffic': 'sum', 'Paid Ad Spend': 'sum', 'Retail Price': 'mean'}
-    
-    for period_name, (start_date, end_date) in periods.items():
+    for period_name, (start_date, end_date) in _period_bounds(most_recent_date).items():
         period_df = df[(df['Week Ending'] >= start_date) & (df['Week Ending'] <= end_date)]
-        period_agg = period_df.groupby(['Brand Owner', 'Brand', 'PCB_Category', 'PCB_Supercategory']).agg(agg_cols).reset_index()
+        period_agg = period_df.groupby(GROUP_KEYS, observed=True).agg(AGG_COLS).reset_index()
         period_agg['Period'] = period_name
         all_periods_agg.append(period_agg)
 
     long_format_df = pd.concat(all_periods_agg, ignore_index=True)
     
-    pivot_df = long_format_df.pivot_table(index=['Brand Owner', 'Brand', 'PCB_Category', 'PCB_Supercategory'], columns='Period', values=agg_cols.keys())
+    pivot_df = long_format_df.pivot_table(index=GROUP_KEYS, columns='Period', values=AGG_COLS.keys())
     pivot_df.columns = ['_'.join(col).strip() for col in pivot_df.columns.values]
     pivot_df.fillna(0, inplace=True)
     
-    # Standardize all column names ONCE to use underscores for consistency
     sanitized_columns = {col: col.replace(' ', '_') for col in pivot_df.columns}
     pivot_df.rename(columns=sanitized_columns, inplace=True)
+    return pivot_df
+
+def _add_derived_columns(pivot_df):
+    """
+    Adds the delta, price/volume and contribution columns to a wide period frame. In memory-optimized
+    mode only TOOL_DERIVED_COLUMNS are kept (other leaf columns are skipped and intermediates dropped),
+    and every metric x period and derived column is stored as float32.
+    """
+    keep = TOOL_DERIVED_COLUMNS if MEMORY_OPTIMIZED else None
+    def wanted(name):
+        return keep is None or name in keep
 
     # --- Calculate All Deltas, Heuristics, and Contributions with Safe Division ---
     causal_metrics = ['Total_Traffic', 'Paid_Ad_Spend', 'Buy_Box_-_Rate']
     for p in ['1', '4', '13', '26']:
         for t in ['P', 'Y']:
             pivot_df[f'L{p}_vs_{t}{p}_Sales_Abs_Chg'] = pivot_df.get(f'Retail_Sales_L{p}', 0) - pivot_df.get(f'Retail_Sales_{t}{p}', 0)
-            pivot_df[f'L{p}_vs_{t}{p}_Units_Abs_Chg'] = pivot_df.get(f'Units_Sold_L{p}', 0) - pivot_df.get(f'Units_Sold_{t}{p}', 0)
+            if wanted(f'L{p}_vs_{t}{p}_Units_Abs_Chg'):
+                pivot_df[f'L{p}_vs_{t}{p}_Units_Abs_Chg'] = pivot_df.get(f'Units_Sold_L{p}', 0) - pivot_df.get(f'Units_Sold_{t}{p}', 0)
             
-            numerator_sales = pivot_df[f'L{p}_vs_{t}{p}_Sales_Abs_Chg']
-            denominator_sales = pivot_df.get(f'Retail_Sales_{t}{p}', 0)
-            pivot_df[f'L{p}_vs_{t}{p}_Sales_Pct_Chg'] = np.where(denominator_sales != 0, numerator_sales / denominator_sales, 0)
+            if wanted(f'L{p}_vs_{t}{p}_Sales_Pct_Chg'):
+                numerator_sales = pivot_df[f'L{p}_vs_{t}{p}_Sales_Abs_Chg']
+                denominator_sales = pivot_df.get(f'Retail_Sales_{t}{p}', 0)
+                pivot_df[f'L{p}_vs_{t}{p}_Sales_Pct_Chg'] = np.where(denominator_sales != 0, numerator_sales / denominator_sales, 0)
             
             for metric_name_key in causal_metrics:
+                if not wanted(f'{metric_name_key}_L{p}_vs_{t}{p}_Pct_Chg'):
+                    continue
                 numerator = pivot_df.get(f'{metric_name_key}_L{p}', 0) - pivot_df.get(f'{metric_name_key}_{t}{p}', 0)
                 denominator = pivot_df.get(f'{metric_name_key}_{t}{p}', 0)
                 pivot_df[f'{metric_name_key}_L{p}_vs_{t}{p}_Pct_Chg'] = np.where(denominator != 0, numerator / denominator, 0)
@@ -97,102 +730,337 @@ def _get_brand_level_analysis_df():
 
     pivot_df['P4_vs_PP4_Sales_Abs_Chg'] = pivot_df.get('Retail_Sales_P4', 0) - pivot_df.get('Retail_Sales_PP4', 0)
     
-    owner_change = pivot_df.groupby('Brand Owner')['L4_vs_P4_Sales_Abs_Chg'].transform('sum')
     category_change = pivot_df.groupby('PCB_Category')['L4_vs_P4_Sales_Abs_Chg'].transform('sum')
-    pivot_df['Contribution_To_Owner_Chg'] = np.where(owner_change != 0, pivot_df['L4_vs_P4_Sales_Abs_Chg'] / owner_change, 0)
+    if wanted('Contribution_To_Owner_Chg'):
+        owner_change = pivot_df.groupby('Brand Owner')['L4_vs_P4_Sales_Abs_Chg'].transform('sum')
+        pivot_df['Contribution_To_Owner_Chg'] = np.where(owner_change != 0, pivot_df['L4_vs_P4_Sales_Abs_Chg'] / owner_change, 0)
     pivot_df['Contribution_To_Cat_Chg'] = np.where(category_change != 0, pivot_df['L4_vs_P4_Sales_Abs_Chg'] / category_change, 0)
-    
-    return pivot_df.reset_index()
+
+    if keep is not None:
+        # Intermediates such as the L1/L13/L26 vs year-ago changes are not read by any tool.
+        pivot_df = pivot_df.drop(columns=[col for col in _DERIVED_INTERMEDIATES if col in pivot_df.columns and col not in keep])
+    pivot_df = pivot_df.reset_index()
+    if keep is not None:
+        # The deltas above are computed at full precision; only the stored frame is downcast.
+        pivot_df = pivot_df.astype({col: 'float32' for col, dtype in pivot_df.dtypes.items() if dtype == 'float64'})
+    # The columns above were added one at a time; copying consolidates them into one block per dtype,
+    # which keeps the tools' row and column takes cheap.
+    return pivot_df.copy()
 
 
 @tool
 def get_category_health() -> str:
     """Provides a high-level health check on focus supercategories across L4 and L13 time periods."""
-    df = _get_brand_level_analysis_df()
-    if df.empty: return "[]"
-    category_health = df.groupby('PCB_Supercategory').sum(numeric_only=True)
-    report = []
-    for cat, row in category_health.iterrows():
-        report.append({"Supercategory": cat, "L4 vs P4 Sales Change": f"${row.get('L4_vs_P4_Sales_Abs_Chg', 0):,.0f}", "L4 vs Y4 Sales Change": f"${row.get('L4_vs_Y4_Sales_Abs_Chg', 0):,.0f}"})
-    return json.dumps(report)
+    return _category_health_report(_get_brand_level_analysis_df(), COMPACT_TOOL_OUTPUT)
 
 @tool
 def get_performance_and_contribution_summary() -> str:
     """Provides a summary of own-brand performance (L1, L4, L13), contribution to change, and identifies major competitor movements based on their contribution to category change."""
-    df = _get_brand_level_analysis_df()
-    if df.empty: return "{}"
-    focus_df = df[df['Brand Owner'].isin(FOCUS_BRAND_OWNER)].copy()
-    focus_summary = focus_df[['Brand', 'PCB_Category', 'L1_vs_P1_Sales_Abs_Chg', 'L4_vs_P4_Sales_Abs_Chg', 'L13_vs_P13_Sales_Abs_Chg', 'L26_vs_P26_Sales_Abs_Chg', 'L4_vs_Y4_Sales_Abs_Chg', 'P4_vs_PP4_Sales_Abs_Chg']].sort_values(by='L4_vs_P4_Sales_Abs_Chg', key=abs, ascending=False)
-    comp_df = df[~df['Brand Owner'].isin(FOCUS_BRAND_OWNER)].copy()
-    significant_comps = comp_df[comp_df['Contribution_To_Cat_Chg'].abs() >= COMPETITOR_CONTRIBUTION_THRESHOLD].sort_values(by='L4_vs_P4_Sales_Abs_Chg', key=abs, ascending=False).head(5)
-    comp_summary = significant_comps[['Brand', 'PCB_Category', 'L4_vs_P4_Sales_Abs_Chg', 'L13_vs_P13_Sales_Abs_Chg', 'Contribution_To_Cat_Chg']]
-    return json.dumps({"focus_brand_summary": focus_summary.to_dict(orient='records'),"competitor_summary": comp_summary.to_dict(orient='records')})
+    return _performance_summary_report(_get_brand_level_analysis_df(), FOCUS_BRAND_OWNER, COMPACT_TOOL_OUTPUT)
 
 @tool
 def get_brand_and_competitor_diagnostics(brand: str, category: str) -> str:
     """Provides detailed metrics for a focus brand and its key competitors, including a pre-calculated causal summary for the focus brand."""
-    df = _get_brand_level_analysis_df()
-    if df.empty: return "{}"
+    if _get_brand_level_analysis_df().empty: return "{}"
+    return _diagnostics_report(_get_analysis_index(), brand, category, COMPACT_TOOL_OUTPUT)
 
-    brand_data = df[(df['Brand'] == brand) & (df['PCB_Category'] == category)]
-    
-    if brand_data.empty:
-        return json.dumps({"focus_brand_diagnostics": {}, "competitor_details": []})
+@tool
+def get_all_focus_brand_diagnostics() -> str:
+    """Provides the price-volume decomposition and causal summary for every focus brand in every category in a single call, plus the key competitors of each of those categories. Use it for full weekly coverage instead of one diagnostics call per brand."""
+    if _get_brand_level_analysis_df().empty: return "{}"
+    return _all_focus_diagnostics_report(_get_analysis_index(), COMPACT_TOOL_OUTPUT)
+
+# --- Async tool variants ---
+# The pandas work runs on a worker thread, so an agent awaiting a tool call (ainvoke / abatch)
+# leaves the event loop free for other LLM calls. The module tools use these as their coroutines.
+def _offloaded(func):
+    """Wraps a sync tool function as a coroutine that runs it in the default executor."""
+    @functools.wraps(func)
+    async def run(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return run
+
+aget_category_health = _offloaded(get_category_health.func)
+aget_performance_and_contribution_summary = _offloaded(get_performance_and_contribution_summary.func)
+aget_brand_and_competitor_diagnostics = _offloaded(get_brand_and_competitor_diagnostics.func)
+aget_all_focus_brand_diagnostics = _offloaded(get_all_focus_brand_diagnostics.func)
+get_category_health.coroutine = aget_category_health
+get_performance_and_contribution_summary.coroutine = aget_performance_and_contribution_summary
+get_brand_and_competitor_diagnostics.coroutine = aget_brand_and_competitor_diagnostics
+get_all_focus_brand_diagnostics.coroutine = aget_all_focus_brand_diagnostics
+
+def make_tools(analysis_df, brand_owners=None, compact=None):
+    """
+    Returns the module tools bound to a precomputed analysis frame and set of focus brand owners,
+    instead of the module-level constants and cache. Used to serve one report configuration
+    out of a batch run (see batch_analysis.py); names, descriptions and arguments match the module tools.
+    compact selects the payload format and defaults to COMPACT_TOOL_OUTPUT.
+    """
+    brand_owners = list(FOCUS_BRAND_OWNER if brand_owners is None else brand_owners)
+    compact = COMPACT_TOOL_OUTPUT if compact is None else compact
+    index = _build_analysis_index(analysis_df, brand_owners)
+
+    def category_health() -> str:
+        return _category_health_report(analysis_df, compact)
+
+    def performance_summary() -> str:
+        return _performance_summary_report(analysis_df, brand_owners, compact)
 
-    brand_row = brand_data.iloc[0]
+    def diagnostics(brand: str, category: str) -> str:
+        if analysis_df.empty: return "{}"
+        return _diagnostics_report(index, brand, category, compact)
 
-    causal_factors = {}
-    metrics_to_summarize = {
-        'Total_Traffic': ('', ',.0f'), 
-        'Paid_Ad_Spend': ('$', ',.0f'), 
-        'Buy_Box_-_Rate': ('', '.1f'), 
+    def all_focus_diagnostics() -> str:
+        if analysis_df.empty: return "{}"
+        return _all_focus_diagnostics_report(index, compact)
+
+    return [
+        StructuredTool.from_function(func=func, coroutine=_offloaded(func), name=template.name,
+                                     description=template.description, args_schema=template.args_schema)
+        for func, template in [
+            (category_health, get_category_health),
+            (performance_summary, get_performance_and_contribution_summary),
+            (diagnostics, get_brand_and_competitor_diagnostics),
+            (all_focus_diagnostics, get_all_focus_brand_diagnostics),
+        ]
+    ]
+
+# --- Column-wise section formatting ---
+# Sections are rendered for any number of rows at once: the columns a section needs are pulled out
+# of the frame in one step (a missing column reads as zeros, like Series.get(..., 0)), formatted one
+# column at a time and zipped back into per-row dicts, instead of per-cell lookups on row Series.
+
+DIAGNOSTIC_PERIODS = ['4', '13', '26']
+CAUSAL_METRICS = {'Total_Traffic': ('', ',.0f'), 'Paid_Ad_Spend': ('$', ',.0f'), 'Buy_Box_-_Rate': ('', '.1f')}
+PRICE_VOLUME_FIELDS = {  # Display name -> (column suffix after L<p>, format, prefix)
+    'Total Change': ('_vs_P{p}_Sales_Abs_Chg', ',.0f', '$'),
+    'Price Effect': ('_Price_Effect', ',.0f', '$'),
+    'Volume Effect': ('_Volume_Effect', ',.0f', '$'),
+    'Price Effect % of Change': ('_Price_Effect_Pct_of_Chg', '.1%', ''),
+    'Volume Effect % of Change': ('_Volume_Effect_Pct_of_Chg', '.1%', ''),
+}
+COMPETITOR_FIELDS = {  # Display name -> (column, format, prefix)
+    'L4 Sales': ('Retail_Sales_L4', ',.0f', '$'),
+    'L4 vs P4 Sales % Chg': ('L4_vs_P4_Sales_Pct_Chg', '.1%', ''),
+    'L4 vs Y4 Sales % Chg': ('L4_vs_Y4_Sales_Pct_Chg', '.1%', ''),
+    'L4 Contribution to Category Change': ('Contribution_To_Cat_Chg', '.1%', ''),
+}
+
+DIAGNOSTIC_COLUMNS = list(dict.fromkeys(
+    [f'L{p}' + suffix.format(p=p) for suffix, _, _ in PRICE_VOLUME_FIELDS.values() for p in DIAGNOSTIC_PERIODS]
+    + [name for metric in CAUSAL_METRICS for p in DIAGNOSTIC_PERIODS
+       for name in (f'{metric}_L{p}', f'{metric}_L{p}_vs_P{p}_Pct_Chg', f'{metric}_L{p}_vs_Y{p}_Pct_Chg')]
+))
+
+COMPACT_COMPETITOR_COLUMNS = ['Brand', 'Retail_Sales_L4', 'L4_vs_P4_Sales_Pct_Chg', 'L4_vs_Y4_Sales_Pct_Chg', 'Contribution_To_Cat_Chg']
+# Columns kept as arrays in the analysis index (see _build_analysis_index).
+SECTION_COLUMNS = list(dict.fromkeys(['Brand', 'PCB_Category'] + DIAGNOSTIC_COLUMNS + COMPACT_COMPETITOR_COLUMNS
+                                     + [column for column, _, _ in COMPETITOR_FIELDS.values()]))
+
+def _column_values(index, names, positions):
+    """Returns {name: array} holding the named columns at the given row positions, from the index's column arrays."""
+    positions = np.asarray(positions, dtype=int)
+    return {name: index['columns'][name][positions] for name in names}
+
+def _format(values, spec, prefix=''):
+    return [f"{prefix}{value:{spec}}" for value in values.tolist()]
+
+def _records(fields):
+    """Turns {key: per-row values} into one dict per row, keys in the given order."""
+    keys = list(fields)
+    return [dict(zip(keys, row)) for row in zip(*fields.values())]
+
+def _price_volume_sections(values):
+    """One 'Price_Volume_Decomposition' dict per row of values (from _column_values over DIAGNOSTIC_COLUMNS)."""
+    return _records({
+        f'L{p}': _records({
+            field: _format(values[f'L{p}' + suffix.format(p=p)], spec, prefix) for field, (suffix, spec, prefix) in PRICE_VOLUME_FIELDS.items()
+        })
+        for p in DIAGNOSTIC_PERIODS
+    })
+
+def _causal_factor_sections(values):
+    """One 'Causal_Factors' dict per row of values: metric -> period -> value, % changes and direction."""
+    metrics = {}
+    for metric_key, (prefix, f_str) in CAUSAL_METRICS.items():
+        periods = {}
+        for p in DIAGNOSTIC_PERIODS:
+            pct_chg_vs_prev = values[f'{metric_key}_L{p}_vs_P{p}_Pct_Chg']
+            periods[f'L{p}'] = _records({
+                'Current Period Value': _format(values[f'{metric_key}_L{p}'], f_str, prefix),
+                '% Chg vs Prev': _format(pct_chg_vs_prev, '.1%'),
+                '% Chg vs YA': _format(values[f'{metric_key}_L{p}_vs_Y{p}_Pct_Chg'], '.1%'),
+                'Interpretation': np.where(pct_chg_vs_prev > 0, "Increased", "Decreased").tolist(),
+            })
+        metrics[metric_key.replace('_', ' ')] = _records(periods)
+    return _records(metrics)
+
+def _competitor_entries(index, positions):
+    """One competitor_details entry per row position."""
+    values = _column_values(index, ['Brand'] + [column for column, _, _ in COMPETITOR_FIELDS.values()], positions)
+    return _records({
+        'Brand': values['Brand'].tolist(),
+        **{field: _format(values[column], spec, prefix) for field, (column, spec, prefix) in COMPETITOR_FIELDS.items()},
+    })
+
+def _compact_decomposition_tables(index, positions):
+    """
+    Long-format compact tables for the rows at positions, as dicts of arrays: price/volume decomposition
+    (one row per brand x period) and causal factors (one row per brand x metric x period), keyed by Brand
+    and PCB_Category.
+    """
+    values = _column_values(index, ['Brand', 'PCB_Category'] + DIAGNOSTIC_COLUMNS, positions)
+    def long_values(names):
+        # Stacking the per-brand columns side by side and ravelling yields brand-major rows.
+        return np.column_stack([values[name] for name in names]).ravel()
+
+    brands = values['Brand']
+    categories = values['PCB_Category']
+    periods = [f'L{p}' for p in DIAGNOSTIC_PERIODS]
+    price_volume = {
+        'Brand': np.repeat(brands, len(periods)),
+        'PCB_Category': np.repeat(categories, len(periods)),
+        'Period': np.tile(periods, len(positions)),
+        'Total_Chg': long_values([f'L{p}_vs_P{p}_Sales_Abs_Chg' for p in DIAGNOSTIC_PERIODS]),
+        'Price_Effect': long_values([f'L{p}_Price_Effect' for p in DIAGNOSTIC_PERIODS]),
+        'Volume_Effect': long_values([f'L{p}_Volume_Effect' for p in DIAGNOSTIC_PERIODS]),
+        'Price_Effect_Pct_of_Chg': long_values([f'L{p}_Price_Effect_Pct_of_Chg' for p in DIAGNOSTIC_PERIODS]),
+        'Volume_Effect_Pct_of_Chg': long_values([f'L{p}_Volume_Effect_Pct_of_Chg' for p in DIAGNOSTIC_PERIODS]),
     }
-    for metric_key, (prefix, f_str) in metrics_to_summarize.items():
-        metric_display_name = metric_key.replace('_', ' ')
-        causal_factors[metric_display_name] = {}
-        for p in ['4', '13', '26']:
-            current_val = brand_row.get(f'{metric_key}_L{p}', 0)
-            pct_chg_vs_prev = brand_row.get(f'{metric_key}_L{p}_vs_P{p}_Pct_Chg', 0)
-            pct_chg_vs_ya = brand_row.get(f'{metric_key}_L{p}_vs_Y{p}_Pct_Chg', 0)
-            interpretation = "Increased" if pct_chg_vs_prev > 0 else "Decreased"
-            
-            causal_factors[metric_display_name][f'L{p}'] = {
-                'Current Period Value': f"{prefix}{current_val:{f_str}}",
-                '% Chg vs Prev': f"{pct_chg_vs_prev:.1%}",
-                '% Chg vs YA': f"{pct_chg_vs_ya:.1%}",
-                'Interpretation': interpretation
-            }
+    pairs = [(metric, p) for metric in CAUSAL_METRICS for p in DIAGNOSTIC_PERIODS]
+    causal = {
+        'Brand': np.repeat(brands, len(pairs)),
+        'PCB_Category': np.repeat(categories, len(pairs)),
+        'Metric': np.tile([metric for metric, _ in pairs], len(positions)),
+        'Period': np.tile([f'L{p}' for _, p in pairs], len(positions)),
+        'Value': long_values([f'{metric}_L{p}' for metric, p in pairs]),
+        'Pct_Chg_vs_Prev': long_values([f'{metric}_L{p}_vs_P{p}_Pct_Chg' for metric, p in pairs]),
+        'Pct_Chg_vs_YA': long_values([f'{metric}_L{p}_vs_Y{p}_Pct_Chg' for metric, p in pairs]),
+    }
+    return price_volume, causal
+
+# --- Report builders behind the tools ---
+# Each tool has a payload builder returning plain Python objects and is serialized by _encode.
+# The default payloads are the pre-formatted dicts the agent prompts were written against; the
+# compact ones are header-plus-rows tables of numbers rounded to COMPACT_SIG_FIGS significant
+# figures (currency in $, *_Pct_* and Contribution_* as ratios), with optional row caps from
+# COMPACT_ROW_LIMITS, which cost far fewer tokens.
+
+def _encode(payload, compact=False):
+    return json.dumps(payload, separators=(',', ':')) if compact else json.dumps(payload)
+
+def _round_sig(value, sig_figs=None):
+    """Rounds numbers to sig_figs significant figures (integral results become ints); other values pass through."""
+    if isinstance(value, (float, np.floating)):
+        rounded = float(f"{value:.{sig_figs or COMPACT_SIG_FIGS}g}")
+        return int(rounded) if rounded.is_integer() else rounded
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+def _compact_table(frame, columns, limit=None):
+    """
+    Encodes frame[columns] as {'columns': [...], 'rows': [[...], ...]} with rounded numbers. frame may
+    be a DataFrame or a dict of arrays; limit keeps only the first rows.
+    """
+    values = [[_round_sig(value) for value in frame[col].tolist()[:limit]] for col in columns]
+    return {'columns': list(columns), 'rows': [list(row) for row in zip(*values)]}
+
+def _category_health_report(df, compact=False):
+    return _encode(_category_health_payload(df, compact), compact)
+
+def _category_health_payload(df, compact=False):
+    if df.empty: return []
+    category_health = df.groupby('PCB_Supercategory')[['L4_vs_P4_Sales_Abs_Chg', 'L4_vs_Y4_Sales_Abs_Chg']].sum().reset_index()
+    if compact:
+        return {'supercategory_health': _compact_table(category_health, ['PCB_Supercategory', 'L4_vs_P4_Sales_Abs_Chg', 'L4_vs_Y4_Sales_Abs_Chg'])}
+    return _records({
+        "Supercategory": category_health['PCB_Supercategory'].tolist(),
+        "L4 vs P4 Sales Change": _format(category_health['L4_vs_P4_Sales_Abs_Chg'].to_numpy(), ',.0f', '$'),
+        "L4 vs Y4 Sales Change": _format(category_health['L4_vs_Y4_Sales_Abs_Chg'].to_numpy(), ',.0f', '$'),
+    })
+
+def _performance_summary_report(df, brand_owners, compact=False):
+    return _encode(_performance_summary_payload(df, brand_owners, compact), compact)
+
+def _performance_summary_payload(df, brand_owners, compact=False):
+    if df.empty: return {}
+    focus_df = df[df['Brand Owner'].isin(brand_owners)].copy()
+    focus_summary = focus_df[['Brand', 'PCB_Category', 'L1_vs_P1_Sales_Abs_Chg', 'L4_vs_P4_Sales_Abs_Chg', 'L13_vs_P13_Sales_Abs_Chg', 'L26_vs_P26_Sales_Abs_Chg', 'L4_vs_Y4_Sales_Abs_Chg', 'P4_vs_PP4_Sales_Abs_Chg']].sort_values(by='L4_vs_P4_Sales_Abs_Chg', key=abs, ascending=False)
+    comp_df = df[~df['Brand Owner'].isin(brand_owners)].copy()
+    significant_comps = comp_df[comp_df['Contribution_To_Cat_Chg'].abs() >= COMPETITOR_CONTRIBUTION_THRESHOLD].sort_values(by='L4_vs_P4_Sales_Abs_Chg', key=abs, ascending=False).head(5)
+    comp_summary = significant_comps[['Brand', 'PCB_Category', 'L4_vs_P4_Sales_Abs_Chg', 'L13_vs_P13_Sales_Abs_Chg', 'Contribution_To_Cat_Chg']]
+    if compact:
+        return {
+            "focus_brand_summary": _compact_table(focus_summary, list(focus_summary.columns), limit=COMPACT_ROW_LIMITS.get('focus_brand_summary')),
+            "competitor_summary": _compact_table(comp_summary, list(comp_summary.columns), limit=COMPACT_ROW_LIMITS.get('competitor_summary')),
+        }
+    return {"focus_brand_summary": focus_summary.to_dict(orient='records'),"competitor_summary": comp_summary.to_dict(orient='records')}
+
+def _diagnostics_report(index, brand, category, compact=False):
+    return _encode(_diagnostics_payload(index, brand, category, compact), compact)
+
+def _diagnostics_payload(index, brand, category, compact=False):
+    position = index['rows'].get((brand, category))
+    if position is None:
+        return {"focus_brand_diagnostics": {}, "competitor_details": []}
 
+    comp_positions = index['competitors'].get(category, [])
+    if compact:
+        price_volume, causal = _compact_decomposition_tables(index, [position])
+        # A single brand's tables do not need the brand key columns.
+        return {
+            "price_volume_decomposition": _compact_table(price_volume, list(price_volume)[2:]),
+            "causal_factors": _compact_table(causal, list(causal)[2:]),
+            "competitor_details": _compact_table(_column_values(index, COMPACT_COMPETITOR_COLUMNS, comp_positions), COMPACT_COMPETITOR_COLUMNS,
+                                                 limit=COMPACT_ROW_LIMITS.get('competitor_details')),
+        }
+
+    values = _column_values(index, DIAGNOSTIC_COLUMNS, [position])
     focus_brand_report = {
-        'Price_Volume_Decomposition': {
-            f'L{p}': {
-                'Total Change': f"${brand_row.get(f'L{p}_vs_P{p}_Sales_Abs_Chg', 0):,.0f}",
-                'Price Effect': f"${brand_row.get(f'L{p}_Price_Effect', 0):,.0f}",
-                'Volume Effect': f"${brand_row.get(f'L{p}_Volume_Effect', 0):,.0f}",
-                'Price Effect % of Change': f"{brand_row.get(f'L{p}_Price_Effect_Pct_of_Chg', 0):.1%}",
-                'Volume Effect % of Change': f"{brand_row.get(f'L{p}_Volume_Effect_Pct_of_Chg', 0):.1%}"
-            } for p in ['4', '13', '26']
-        },
-        'Causal_Factors': causal_factors
+        'Price_Volume_Decomposition': _price_volume_sections(values)[0],
+        'Causal_Factors': _causal_factor_sections(values)[0],
+    }
+    return {
+        "focus_brand_diagnostics": focus_brand_report,
+        "competitor_details": _competitor_entries(index, comp_positions)
     }
 
-    comp_df = df[(df['PCB_Category'] == category) & (~df['Brand Owner'].isin(FOCUS_BRAND_OWNER))].copy()
-    comp_df = comp_df.sort_values(by='Contribution_To_Cat_Chg', key=abs, ascending=False).head(5)
-    
-    comp_report_list = []
-    for _, row in comp_df.iterrows():
-        comp_report_list.append({
-            'Brand': row['Brand'],
-            'L4 Sales': f"${row.get('Retail_Sales_L4', 0):,.0f}",
-            'L4 vs P4 Sales % Chg': f"{row.get('L4_vs_P4_Sales_Pct_Chg', 0):.1%}",
-            'L4 vs Y4 Sales % Chg': f"{row.get('L4_vs_Y4_Sales_Pct_Chg', 0):.1%}",
-            'L4 Contribution to Category Change': f"{row.get('Contribution_To_Cat_Chg', 0):.1%}",
-        })
+def _all_focus_diagnostics_report(index, compact=False):
+    return _encode(_all_focus_diagnostics_payload(index, compact), compact)
 
-    return json.dumps({
-        "focus_brand_diagnostics": focus_brand_report,
-        "competitor_details": comp_report_list
+def _all_focus_diagnostics_payload(index, compact=False):
+    """
+    Diagnostics for every focus brand x category in one payload. The sections are rendered for all
+    focus rows at once, and competitor details are listed once per category instead of per brand.
+    """
+    if not index['focus_pairs']:
+        return {"focus_brand_diagnostics": [], "competitor_details": {}}
+
+    positions = [index['rows'][pair] for pair in index['focus_pairs']]
+    categories = list(dict.fromkeys(category for _, category in index['focus_pairs']))
+    if compact:
+        price_volume, causal = _compact_decomposition_tables(index, positions)
+        limit = COMPACT_ROW_LIMITS.get('competitor_details')
+        comp_positions = [position for category in categories for position in list(index['competitors'].get(category, []))[:limit]]
+        comp_columns = ['PCB_Category'] + COMPACT_COMPETITOR_COLUMNS
+        return {
+            "price_volume_decomposition": _compact_table(price_volume, list(price_volume)),
+            "causal_factors": _compact_table(causal, list(causal)),
+            "competitor_details": _compact_table(_column_values(index, comp_columns, comp_positions), comp_columns),
+        }
+
+    values = _column_values(index, DIAGNOSTIC_COLUMNS, positions)
+    reports = _records({
+        'Brand': [brand for brand, _ in index['focus_pairs']],
+        'Category': [category for _, category in index['focus_pairs']],
+        'Price_Volume_Decomposition': _price_volume_sections(values),
+        'Causal_Factors': _causal_factor_sections(values),
     })
+    return {
+        "focus_brand_diagnostics": reports,
+        "competitor_details": {category: _competitor_entries(index, index['competitors'].get(category, [])) for category in categories},
+    }
 
 if __name__ == '__main__':
     print("--- Testing Tool with Corrected Aggregation: get_performance_and_contribution_summary ---")
@@ -200,12 +1068,16 @@ if __name__ == '__main__':
     print(json.dumps(json.loads(summary), indent=2))
     
     print("\n--- Testing Tool with ENRICHED Causal and Competitor Summary ---")
-    summary_data = json.loads(summary)
-    if summary_data['focus_brand_summary']:
-        first_brand = summary_data['focus_brand_summary'][0]
+    focus_pairs = _get_analysis_index()['focus_pairs']
+    if focus_pairs:
+        brand, category = focus_pairs[0]
         diagnostics = get_brand_and_competitor_diagnostics.invoke({
-            "brand": first_brand['Brand'], 
-            "category": first_brand['PCB_Category']
+            "brand": brand, 
+            "category": category
         })
-        print(f"running deep dive on {first_brand['Brand']} / {first_brand['PCB_Category']} ")
+        print(f"running deep dive on {brand} / {category} ")
         print(json.dumps(json.loads(diagnostics), indent=2))
+
+    print("\n--- Testing Bulk Tool: get_all_focus_brand_diagnostics ---")
+    all_diagnostics = get_all_focus_brand_diagnostics.invoke({})
+    print(f"{len(focus_pairs)} focus brand x category pairs, {len(all_diagnostics):,} characters")
@@ -1,5 +1,8 @@
 import os
+import re
 import json
+import asyncio
+import argparse
 from typing import TypedDict, List, Annotated
 import operator
 from datetime import datetime
@@ -9,6 +12,7 @@ from langchain_openai import AzureChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 
 from langgraph.graph import StateGraph, END
 
@@ -16,11 +20,23 @@ from langgraph.graph import StateGraph, END
 from brand_analysis_tools import (
     get_category_health, 
     get_performance_and_contribution_summary, 
-    get_brand_and_competitor_diagnostics
+    get_brand_and_competitor_diagnostics,
+    get_all_focus_brand_diagnostics,
+    analysis_fingerprint,
+    awarm_cache,
 )
+from run_metrics import RunMetrics
+from agent_cache import AgentCache
 
 load_dotenv()
 
+# Maximum number of plan tasks the Brand Analyst works on at the same time.
+ANALYST_MAX_CONCURRENCY = int(os.environ.get("ANALYST_MAX_CONCURRENCY", "4"))
+
+# Outputs of the category, supervisor and analyst agents are reused across runs while their inputs
+# are unchanged. Set AGENT_CACHE_BYPASS=1 (or pass --no-cache) to always call the model.
+agent_cache = AgentCache(enabled=os.environ.get("AGENT_CACHE_BYPASS", "").lower() not in ("1", "true", "yes"))
+
 # --- 1. Define Agent State ---
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], operator.add]
@@ -35,6 +51,85 @@ def save_markdown(filename: str, content: str):
         f.write(content)
     print(f"--- Saved output to {filename} ---")
 
+_TASK_LINE = re.compile(r'^\s*(\d+)[.)]\s+(.*)$')
+_SUBTASK_LINE = re.compile(r'^\s*[-*\u2022]\s+(.*)$')
+
+def parse_plan_tasks(plan: str) -> List[str]:
+    """
+    Splits the Supervisor's numbered plan into standalone analyst tasks, in plan order.
+    Bulleted sub-items of a numbered task (e.g. one line per competitor) become their own
+    tasks, prefixed with the parent task. A plan without numbering is returned as one task.
+    """
+    numbered = []
+    for line in plan.splitlines():
+        task_match = _TASK_LINE.match(line)
+        subtask_match = _SUBTASK_LINE.match(line)
+        if task_match:
+            numbered.append({"number": task_match.group(1), "text": task_match.group(2).strip(), "subtasks": []})
+        elif subtask_match and numbered:
+            numbered[-1]["subtasks"].append(subtask_match.group(1).strip())
+        elif line.strip() and numbered:
+            numbered[-1]["text"] += " " + line.strip()
+
+    if not numbered:
+        return [plan.strip()] if plan.strip() else []
+
+    tasks = []
+    for task in numbered:
+        if task["subtasks"]:
+            tasks.extend(f"{task['number']}. {task['text']} {subtask}" for subtask in task["subtasks"])
+        else:
+            tasks.append(f"{task['number']}. {task['text']}")
+    return tasks
+
+def _agent_cache_key(agent, inputs):
+    """Content address of one agent call: system prompt, input messages, tool data and model deployment."""
+    prompts = [prompt.pretty_repr() for prompt in agent.agent.runnable.get_prompts()]
+    messages = [(message.type, message.name, message.content) for message in inputs["messages"]]
+    return AgentCache.make_key(
+        prompts, messages, [t.name for t in agent.tools], analysis_fingerprint(),
+        os.environ.get("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"),
+    )
+
+def _cached_outputs(agent, inputs_list):
+    """Returns (keys, outputs, misses): the cache key and cached output (None on a miss) per input, and the miss positions."""
+    keys = [_agent_cache_key(agent, inputs) for inputs in inputs_list]
+    outputs = [agent_cache.get(key) for key in keys]
+    misses = [i for i, output in enumerate(outputs) if output is None]
+    if len(misses) < len(outputs):
+        print(f"--- Reusing {len(outputs) - len(misses)} cached agent output(s) ---")
+    return keys, outputs, misses
+
+def _store_outputs(keys, outputs, misses, results):
+    for i, result in zip(misses, results):
+        outputs[i] = result['output']
+        agent_cache.put(keys[i], result['output'])
+    return outputs
+
+def invoke_agent_cached(agent, inputs, config=None) -> str:
+    """Returns the agent's output for inputs, from agent_cache when the same call was answered before."""
+    return batch_agent_cached(agent, [inputs], config)[0]
+
+def batch_agent_cached(agent, inputs_list, config=None) -> List[str]:
+    """Like invoke_agent_cached for several inputs; only the cache misses are sent to the model, as one batch."""
+    keys, outputs, misses = _cached_outputs(agent, inputs_list)
+    if misses:
+        results = agent.batch([inputs_list[i] for i in misses], config=config)
+        _store_outputs(keys, outputs, misses, results)
+    return outputs
+
+async def ainvoke_agent_cached(agent, inputs, config=None) -> str:
+    """Async invoke_agent_cached."""
+    return (await abatch_agent_cached(agent, [inputs], config))[0]
+
+async def abatch_agent_cached(agent, inputs_list, config=None) -> List[str]:
+    """Async batch_agent_cached."""
+    keys, outputs, misses = _cached_outputs(agent, inputs_list)
+    if misses:
+        results = await agent.abatch([inputs_list[i] for i in misses], config=config)
+        _store_outputs(keys, outputs, misses, results)
+    return outputs
+
 def create_agent(llm, tools, system_prompt: str):
     """Factory function to create a new agent."""
     prompt = ChatPromptTemplate.from_messages([
@@ -46,26 +141,36 @@ def create_agent(llm, tools, system_prompt: str):
     return AgentExecutor(agent=agent, tools=tools, verbose=True)
 
 # --- 3. Initialize LLM and Agents ---
-llm = AzureChatOpenAI(
-    openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2023-07-01-preview"),
-    azure_deployment=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"],
-)
-
-category_agent = create_agent(llm, [get_category_health], 
-    "You are a market intelligence analyst. Your job is to call the `get_category_health` tool and summarize the findings in a brief, introductory paragraph.")
-
-# UPDATED SUPERVISOR PROMPT
-supervisor_agent = create_agent(llm, [get_performance_and_contribution_summary],
-    """You are a Supervisor. Your role is to plan the weekly analysis.
+def create_llm():
+    """Returns the Azure OpenAI chat model configured in the environment (.env)."""
+    return AzureChatOpenAI(
+        openai_api_version=os.environ.get("AZURE_OPENAI_API_VERSION", "2023-07-01-preview"),
+        azure_deployment=os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"],
+    )
+
+# Agents are built on first use instead of at import time, so the module imports without Azure
+# settings and tests can run the nodes on a fake chat model through init_agents(llm).
+agents = {}
+
+def init_agents(llm=None):
+    """(Re)builds the four agents on llm, the Azure model from create_llm() by default, and returns them by name."""
+    llm = create_llm() if llm is None else llm
+    agents['category'] = create_agent(llm, [get_category_health], 
+        "You are a market intelligence analyst. Your job is to call the `get_category_health` tool and summarize the findings in a brief, introductory paragraph.")
+
+    # UPDATED SUPERVISOR PROMPT
+    agents['supervisor'] = create_agent(llm, [get_performance_and_contribution_summary, get_all_focus_brand_diagnostics],
+        """You are a Supervisor. Your role is to plan the weekly analysis.
     1. Use the `get_performance_and_contribution_summary` tool to get the data.
     2. From the `focus_brand_summary`, identify the most important brands to analyze.
-    3. From the `competitor_summary`, identify the most significant competitor movements.
-    4. Create a concise, numbered list of investigation tasks for the BrandAnalyst. Explicitly include tasks for both your own brands AND the key competitors you identified.
+    3. Use the `get_all_focus_brand_diagnostics` tool once to review the price/volume drivers and causal factors of every focus brand, so that no focus brand with a notable driver change is left out of the plan.
+    4. From the `competitor_summary`, identify the most significant competitor movements.
+    5. Create a concise, numbered list of investigation tasks for the BrandAnalyst. Explicitly include tasks for both your own brands AND the key competitors you identified.
     Your output should be ONLY the numbered list of tasks.""")
 
-# The Brand Analyst agent now uses the more advanced prompt below
-brand_analyst_agent = create_agent(llm, [get_brand_and_competitor_diagnostics],
-    """You are a specialist Brand Analyst agent. Your role is to interpret a rich set of pre-calculated data to explain business performance. You must not perform any mathematical calculations yourself. Your entire analysis must be based on synthesizing the metrics provided by your tools.
+    # The Brand Analyst agent now uses the more advanced prompt below
+    agents['brand_analyst'] = create_agent(llm, [get_brand_and_competitor_diagnostics],
+        """You are a specialist Brand Analyst agent. Your role is to interpret a rich set of pre-calculated data to explain business performance. You must not perform any mathematical calculations yourself. Your entire analysis must be based on synthesizing the metrics provided by your tools.
 
 For each numbered task you receive, you must perform a detailed investigation.
 
@@ -88,8 +193,8 @@ Your goal is to understand what drove their performance.
 Address each task separately and clearly.
 """)
 
-final_report_agent = create_agent(llm, [], 
-    """
+    agents['final_report'] = create_agent(llm, [], 
+        """
     You are a senior business strategist analyzing the most recent sales data from Amazon. You work in the pet food industry for Post Consumer Brands, and your brands are Rachael Ray Nutrish, Nature's Recipe, 9Lives, and Kibbles 'n Bits. Your task is to synthesize multiple inputs — a category health summary and detailed brand-level analyses — into a single, cohesive, and forward-looking business review in Markdown.
 
     Your primary goal is not just to report the data, but to tell a clear story about our position in the market and to provide actionable intelligence.
@@ -122,34 +227,80 @@ final_report_agent = create_agent(llm, [],
         c. **Define the intended outcome** (e.g., "The goal is to restore our primary sales channel and defend our market share against growing competitors like Sheba and Tiki Pets.").
         
     """)
+    return agents
+
+def get_agent(name):
+    """Returns the named agent, building all agents on the Azure model on first use."""
+    if not agents:
+        init_agents()
+    return agents[name]
 
 # --- 4. Define Graph Nodes ---
-def category_health_node(state: AgentState):
+# Every node has a sync and an async variant, so the graph runs under app.invoke as well as app.ainvoke.
+# In the async variants LLM calls are awaited and tool calls run their pandas work on worker threads.
+# Nodes hand their config to the agents so run callbacks (e.g. RunMetrics) see every LLM and tool call.
+def _record_category_health(state, output):
+    state['category_health_summary'] = output
+    state['messages'].append(HumanMessage(content=output, name="CategoryAgent"))
+    return state
+
+def category_health_node(state: AgentState, config: RunnableConfig):
+    print("\n---PHASE 1: CATEGORY HEALTH CHECK---")
+    return _record_category_health(state, invoke_agent_cached(get_agent('category'), state, config))
+
+async def acategory_health_node(state: AgentState, config: RunnableConfig):
     print("\n---PHASE 1: CATEGORY HEALTH CHECK---")
-    result = category_agent.invoke(state)
-    state['category_health_summary'] = result['output']
-    state['messages'].append(HumanMessage(content=result['output'], name="CategoryAgent"))
+    # Build the brand-level analysis frame while the category agent waits on its first LLM call;
+    # its tool call (and every later one) then finds the frame cached.
+    warm = asyncio.create_task(awarm_cache())
+    output = await ainvoke_agent_cached(get_agent('category'), state, config)
+    await warm
+    return _record_category_health(state, output)
+
+def _record_supervisor_plan(state, output):
+    state['supervisor_plan'] = output
+    state['messages'].append(HumanMessage(content=output, name="Supervisor"))
+    save_markdown("01_supervisor_plan.md", f"# Supervisor Investigation Plan\n\n{output}")
     return state
 
-def supervisor_planning_node(state: AgentState):
+def supervisor_planning_node(state: AgentState, config: RunnableConfig):
     print("\n---PHASE 2: SUPERVISOR PLANNING---")
-    result = supervisor_agent.invoke(state)
-    state['supervisor_plan'] = result['output']
-    state['messages'].append(HumanMessage(content=result['output'], name="Supervisor"))
-    save_markdown("01_supervisor_plan.md", f"# Supervisor Investigation Plan\n\n{result['output']}")
+    return _record_supervisor_plan(state, invoke_agent_cached(get_agent('supervisor'), state, config))
+
+async def asupervisor_planning_node(state: AgentState, config: RunnableConfig):
+    print("\n---PHASE 2: SUPERVISOR PLANNING---")
+    return _record_supervisor_plan(state, await ainvoke_agent_cached(get_agent('supervisor'), state, config))
+
+# Each plan task gets its own analyst run with the full context (category health and plan),
+# and up to ANALYST_MAX_CONCURRENCY runs execute at once. (a)batch() returns results in task order.
+def _analyst_inputs(state):
+    tasks = parse_plan_tasks(state['supervisor_plan'])
+    inputs = [
+        {"messages": state['messages'] + [HumanMessage(content=f"Investigate only this task from the plan:\n{task}")]}
+        for task in tasks
+    ]
+    return tasks, inputs
+
+def _record_analyst_findings(state, tasks, outputs):
+    findings = "\n\n".join(f"## {task}\n\n{output}" for task, output in zip(tasks, outputs))
+    state['analyst_findings'] = findings
+    state['messages'].append(HumanMessage(content=findings, name="BrandAnalyst"))
+    save_markdown("02_analyst_findings.md", f"# Brand Analyst Findings\n\n{findings}")
     return state
 
-def brand_analyst_node(state: AgentState):
+def brand_analyst_node(state: AgentState, config: RunnableConfig):
     print("\n---PHASE 3: BRAND ANALYST INVESTIGATION---")
-    # The analyst now receives the full context including the category health and the plan
-    result = brand_analyst_agent.invoke(state)
-    state['analyst_findings'] = result['output']
-    state['messages'].append(HumanMessage(content=result['output'], name="BrandAnalyst"))
-    save_markdown("02_analyst_findings.md", f"# Brand Analyst Findings\n\n{result['output']}")
-    return state
+    tasks, inputs = _analyst_inputs(state)
+    outputs = batch_agent_cached(get_agent('brand_analyst'), inputs, config={**config, "max_concurrency": ANALYST_MAX_CONCURRENCY})
+    return _record_analyst_findings(state, tasks, outputs)
 
-def supervisor_reporting_node(state: AgentState):
-    print("\n---PHASE 4: FINAL REPORTING---")
+async def abrand_analyst_node(state: AgentState, config: RunnableConfig):
+    print("\n---PHASE 3: BRAND ANALYST INVESTIGATION---")
+    tasks, inputs = _analyst_inputs(state)
+    outputs = await abatch_agent_cached(get_agent('brand_analyst'), inputs, config={**config, "max_concurrency": ANALYST_MAX_CONCURRENCY})
+    return _record_analyst_findings(state, tasks, outputs)
+
+def _final_report_inputs(state):
     final_prompt = f"""Here is all the information gathered for the weekly report:
     
     ## Category Health Summary:
@@ -159,17 +310,26 @@ def supervisor_reporting_node(state: AgentState):
     {state['analyst_findings']}
     
     Please compile the final report based on these inputs."""
-    
-    result = final_report_agent.invoke({"messages": [HumanMessage(content=final_prompt)]})
+    return {"messages": [HumanMessage(content=final_prompt)]}
+
+def _record_final_report(state, result):
     state['messages'].append(HumanMessage(content=result['output'], name="FinalReportAgent"))
     return state
 
+def supervisor_reporting_node(state: AgentState, config: RunnableConfig):
+    print("\n---PHASE 4: FINAL REPORTING---")
+    return _record_final_report(state, get_agent('final_report').invoke(_final_report_inputs(state), config=config))
+
+async def asupervisor_reporting_node(state: AgentState, config: RunnableConfig):
+    print("\n---PHASE 4: FINAL REPORTING---")
+    return _record_final_report(state, await get_agent('final_report').ainvoke(_final_report_inputs(state), config=config))
+
 # --- 5. Build and Run the Graph ---
 workflow = StateGraph(AgentState)
-workflow.add_node("CategoryHealth", category_health_node)
-workflow.add_node("SupervisorPlanning", supervisor_planning_node)
-workflow.add_node("BrandAnalyst", brand_analyst_node)
-workflow.add_node("FinalReporting", supervisor_reporting_node)
+workflow.add_node("CategoryHealth", RunnableLambda(category_health_node, afunc=acategory_health_node))
+workflow.add_node("SupervisorPlanning", RunnableLambda(supervisor_planning_node, afunc=asupervisor_planning_node))
+workflow.add_node("BrandAnalyst", RunnableLambda(brand_analyst_node, afunc=abrand_analyst_node))
+workflow.add_node("FinalReporting", RunnableLambda(supervisor_reporting_node, afunc=asupervisor_reporting_node))
 
 workflow.set_entry_point("CategoryHealth")
 workflow.add_edge("CategoryHealth", "SupervisorPlanning")
@@ -179,14 +339,26 @@ workflow.add_edge("FinalReporting", END)
 
 app = workflow.compile()
 
+async def arun_workflow(initial_state, config=None):
+    """Runs the compiled workflow on the event loop (app.ainvoke) and returns the final state. app.invoke runs it synchronously."""
+    return await app.ainvoke(initial_state, config=config)
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the weekly agentic sales analysis.")
+    parser.add_argument('--no-cache', action='store_true', help="Ignore cached agent outputs and call the model for every stage")
+    args = parser.parse_args()
+    agent_cache.enabled = agent_cache.enabled and not args.no_cache
+
     initial_message = {"messages": [HumanMessage(content="Begin the weekly performance analysis.")]}
-    final_state = app.invoke(initial_message)
+    metrics = RunMetrics()
+    final_state = asyncio.run(arun_workflow(initial_message, config={"callbacks": [metrics]}))
     
     final_report = final_state['messages'][-1].content
     date_str = datetime.now().strftime("%Y-%m-%d")
     final_filename = f"03_final_report_{date_str}.md"
     save_markdown(final_filename, final_report)
+    metrics.write_jsonl(f"04_run_metrics_{date_str}.jsonl")
+    metrics.print_summary()
 
     print("\n" + "="*60)
     print("Agentic workflow complete.")
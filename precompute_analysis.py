@@ -0,0 +1,36 @@
+"""
+Offline precompute of the brand-level analysis.
+
+Run after each data drop (and after ingest_weeks / build_snapshot). It builds the analysis frame
+from the current source and writes it, together with its metadata (most recent week, period
+boundaries, focus configuration, source signatures), to a versioned Arrow artifact. While that
+artifact is fresh, agent runs memory-map it instead of loading the extract and aggregating it.
+
+Usage:
+    python precompute_analysis.py --snapshot
+    python precompute_analysis.py --check
+"""
+import json
+import argparse
+
+import brand_analysis_tools as bat
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write the precomputed brand-level analysis artifact used by the agent tools.")
+    parser.add_argument('--artifact', default=bat.ANALYSIS_ARTIFACT_FILE, help="Artifact path")
+    parser.add_argument('--snapshot', action='store_true', help="Rebuild the Parquet snapshot from the CSV first")
+    parser.add_argument('--check', action='store_true', help="Only print the artifact's metadata and whether it is fresh")
+    args = parser.parse_args()
+
+    if args.check:
+        metadata = bat.read_artifact_metadata(args.artifact)
+        if metadata is None:
+            print(f"WARNING: no analysis artifact at '{args.artifact}'.")
+        else:
+            print(json.dumps(metadata, indent=2))
+            print(f"Fresh: {bat._artifact_is_fresh(metadata)}")
+    else:
+        if args.snapshot:
+            bat.build_snapshot()
+        bat.build_analysis_artifact(args.artifact)
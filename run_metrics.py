@@ -0,0 +1,157 @@
+"""
+Structured instrumentation for a LangGraph run.
+
+RunMetrics is a LangChain callback handler: pass it in the graph's config and it records per-node
+wall time, per-tool-call latency and payload sizes, and every LLM call with its prompt/completion
+tokens, attributed to the graph node it ran under. The events can be written as JSON lines and
+summarized at the end of the run. It only relies on callbacks, so it works with any chat model,
+including stubbed ones.
+
+    metrics = RunMetrics()
+    final_state = asyncio.run(arun_workflow(initial_state, config={"callbacks": [metrics]}))
+    # or synchronously: app.invoke(initial_state, config={"callbacks": [metrics]})
+    metrics.write_jsonl("04_run_metrics.jsonl")
+    metrics.print_summary()
+"""
+import json
+import time
+import threading
+from collections import defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class RunMetrics(BaseCallbackHandler):
+    """Collects node, tool and LLM events for one graph run. Safe to use from concurrent workers."""
+
+    # Called directly on the event loop in async runs (the handlers only take a lock and a timestamp),
+    # so timings are not skewed by waiting for an executor thread.
+    run_inline = True
+
+    def __init__(self):
+        self.events = []
+        self._started = {}
+        self._lock = threading.Lock()
+        self._run_start = time.perf_counter()
+
+    # --- Bookkeeping ---
+    def _start(self, run_id, **details):
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), details)
+
+    def _finish(self, run_id, event, **extra):
+        with self._lock:
+            started = self._started.pop(run_id, None)
+            if started is None:
+                return
+            start, details = started
+            self.events.append({
+                'event': event,
+                'start_offset_s': round(start - self._run_start, 4),
+                'seconds': round(time.perf_counter() - start, 4),
+                **details,
+                **extra,
+            })
+
+    @staticmethod
+    def _node(metadata):
+        return (metadata or {}).get('langgraph_node')
+
+    # --- Graph nodes ---
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        # LangGraph runs each node as a chain named after the node; nested chains are skipped.
+        node = self._node(metadata)
+        if node is not None and kwargs.get('name') == node:
+            self._start(run_id, node=node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id, 'node', status='ok')
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, 'node', status='error', error=repr(error))
+
+    # --- LLM calls ---
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, node=self._node(metadata))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, node=self._node(metadata))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = _token_usage(response)
+        self._finish(run_id, 'llm', status='ok', prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, 'llm', status='error', error=repr(error), prompt_tokens=0, completion_tokens=0)
+
+    # --- Tool calls ---
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs):
+        tool_name = kwargs.get('name') or (serialized or {}).get('name')
+        self._start(run_id, node=self._node(metadata), tool=tool_name, input_chars=len(input_str or ''))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, 'content', output)
+        self._finish(run_id, 'tool', status='ok', output_chars=len(str(content)))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, 'tool', status='error', error=repr(error), output_chars=0)
+
+    # --- Reporting ---
+    def summary(self):
+        """Aggregates the events per node: wall time, LLM calls and tokens, tool calls and tool time."""
+        per_node = defaultdict(lambda: {'wall_s': 0.0, 'llm_calls': 0, 'llm_s': 0.0, 'prompt_tokens': 0,
+                                        'completion_tokens': 0, 'tool_calls': 0, 'tool_s': 0.0})
+        with self._lock:
+            events = list(self.events)
+        for event in events:
+            stats = per_node[event.get('node') or '(outside graph)']
+            if event['event'] == 'node':
+                stats['wall_s'] += event['seconds']
+            elif event['event'] == 'llm':
+                stats['llm_calls'] += 1
+                stats['llm_s'] += event['seconds']
+                stats['prompt_tokens'] += event['prompt_tokens']
+                stats['completion_tokens'] += event['completion_tokens']
+            elif event['event'] == 'tool':
+                stats['tool_calls'] += 1
+                stats['tool_s'] += event['seconds']
+        return {
+            'total_wall_s': round(time.perf_counter() - self._run_start, 4),
+            'nodes': {node: {key: round(value, 4) for key, value in stats.items()} for node, stats in per_node.items()},
+        }
+
+    def write_jsonl(self, path):
+        """Writes one JSON object per event, followed by a final 'summary' line."""
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+            f.write(json.dumps({'event': 'summary', **self.summary()}) + '\n')
+        print(f"--- Saved run metrics to {path} ---")
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"\n{'node':<22} {'wall s':>8} {'LLM calls':>10} {'LLM s':>8} {'prompt tok':>11} {'compl. tok':>11} {'tool calls':>11} {'tool s':>8}")
+        for node, s in summary['nodes'].items():
+            print(f"{node:<22} {s['wall_s']:>8.2f} {s['llm_calls']:>10} {s['llm_s']:>8.2f} {s['prompt_tokens']:>11,} "
+                  f"{s['completion_tokens']:>11,} {s['tool_calls']:>11} {s['tool_s']:>8.2f}")
+        print(f"Total wall time: {summary['total_wall_s']:.2f}s")
+
+
+def _token_usage(response):
+    """Returns (prompt, completion) tokens from an LLMResult, preferring per-message usage metadata."""
+    prompt_tokens = completion_tokens = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+            if usage:
+                found = True
+                prompt_tokens += usage.get('input_tokens', 0)
+                completion_tokens += usage.get('output_tokens', 0)
+    if not found:
+        token_usage = (response.llm_output or {}).get('token_usage') or {}
+        prompt_tokens = token_usage.get('prompt_tokens', 0)
+        completion_tokens = token_usage.get('completion_tokens', 0)
+    return prompt_tokens, completion_tokens
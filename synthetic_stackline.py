@@ -0,0 +1,109 @@
+"""
+Synthetic Stackline-shaped sales data for benchmarks and offline runs.
+
+The generated frame has the columns brand_analysis_tools reads from stackline_sales.csv, with one
+row per Week Ending x retailer x brand x category. Retailer 1, the 'Total Pet' supercategory and
+the 'POST HOLDINGS INC' owner are always present, so the default focus constants select data.
+
+Usage:
+    python synthetic_stackline.py stackline_sales.csv --brands 200 --categories 12 --retailers 2 --weeks 156
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+SUPERCATEGORY_NAMES = ['Total Pet', 'Total Baby', 'Total Beauty', 'Total Grocery', 'Total Household']
+FOCUS_OWNER_NAME = 'POST HOLDINGS INC'
+
+
+def generate_stackline_sales(brands=40, categories=8, retailers=1, weeks=104, categories_per_brand=3,
+                             supercategories=2, brands_per_owner=4, end_date='2025-06-21', seed=0):
+    """
+    Returns a DataFrame in the stackline_sales.csv schema.
+
+    Categories and brands are spread round-robin over the supercategories, each brand sells in up
+    to categories_per_brand categories of its supercategory, and brands are grouped into owners of
+    brands_per_owner (the first owner is the focus owner). About 5% of brand-weeks are missing and
+    2% of rows have no Organic Traffic, to exercise the loader's dropna.
+    """
+    rng = np.random.default_rng(seed)
+    supercategories = max(1, min(supercategories, len(SUPERCATEGORY_NAMES), categories))
+    supercategory_names = np.array(SUPERCATEGORY_NAMES[:supercategories])
+    category_supercategory = np.arange(categories) % supercategories
+    category_names = np.array([f'{supercategory_names[sc].split()[-1]} Category {i + 1}' for i, sc in enumerate(category_supercategory)])
+    owner_names = np.array([FOCUS_OWNER_NAME] + [f'OWNER {i + 1}' for i in range(brands // brands_per_owner + 1)])
+    brand_names = np.array([f'Brand {i + 1}' for i in range(brands)])
+
+    # (brand, category) pairs: each brand sells in some categories of its own supercategory.
+    pair_brand, pair_category = [], []
+    for brand in range(brands):
+        own_categories = np.flatnonzero(category_supercategory == brand % supercategories)
+        chosen = rng.choice(own_categories, size=min(categories_per_brand, len(own_categories)), replace=False)
+        pair_brand.extend([brand] * len(chosen))
+        pair_category.extend(chosen)
+    pair_brand = np.array(pair_brand)
+    pair_category = np.array(pair_category)
+    n_pairs = len(pair_brand)
+
+    week_dates = pd.date_range(end=pd.Timestamp(end_date), periods=weeks, freq='7D')
+    week_idx = np.repeat(np.arange(weeks), retailers * n_pairs)
+    retailer_idx = np.tile(np.repeat(np.arange(retailers), n_pairs), weeks)
+    pair_idx = np.tile(np.arange(n_pairs), weeks * retailers)
+    keep = rng.random(len(pair_idx)) >= 0.05
+    week_idx, retailer_idx, pair_idx = week_idx[keep], retailer_idx[keep], pair_idx[keep]
+    n_rows = len(pair_idx)
+
+    brand_idx = pair_brand[pair_idx]
+    category_idx = pair_category[pair_idx]
+    base_price = rng.uniform(3, 60, n_pairs)[pair_idx]
+    base_units = rng.lognormal(6, 1.2, n_pairs)[pair_idx] / (1 + retailer_idx)
+    trend = 1 + rng.normal(0, 0.004, n_pairs)[pair_idx] * week_idx
+    seasonality = 1 + 0.15 * np.sin(2 * np.pi * week_idx / 52)
+
+    units = np.maximum(base_units * trend * seasonality * rng.lognormal(0, 0.15, n_rows), 0).round()
+    price = base_price * rng.normal(1, 0.03, n_rows)
+    organic_traffic = units * rng.uniform(8, 15, n_rows)
+    paid_traffic = units * rng.uniform(1, 5, n_rows)
+    organic_traffic[rng.random(n_rows) < 0.02] = np.nan
+
+    return pd.DataFrame({
+        'Week Ending': week_dates[week_idx].strftime('%Y-%m-%d'),
+        'Retailer ID': retailer_idx + 1,
+        'Brand Owner': owner_names[brand_idx // brands_per_owner],
+        'Brand': brand_names[brand_idx],
+        'PCB_Category': category_names[category_idx],
+        'PCB_Supercategory': supercategory_names[category_supercategory[category_idx]],
+        'Retail Sales': (units * price).round(2),
+        'Units Sold': units,
+        'Retail Price': price.round(2),
+        'Total Traffic': (np.nan_to_num(organic_traffic) + paid_traffic).round(),
+        'Organic Traffic': organic_traffic.round(),
+        'Paid Traffic': paid_traffic.round(),
+        'Paid Ad Spend': (paid_traffic * rng.uniform(0.5, 1.5, n_rows)).round(2),
+        'In-Stock Rate': rng.beta(20, 1, n_rows).round(4),
+        'Weeks On-Hand': rng.gamma(4, 1.5, n_rows).round(2),
+        'Buy Box - Rate': rng.beta(15, 1, n_rows).round(4),
+    })
+
+
+def write_stackline_csv(path='stackline_sales.csv', **kwargs):
+    """Generates synthetic data with generate_stackline_sales(**kwargs) and writes it to path."""
+    df = generate_stackline_sales(**kwargs)
+    df.to_csv(path, index=False)
+    return len(df)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic Stackline-shaped sales extract.")
+    parser.add_argument('path', nargs='?', default='stackline_sales.csv')
+    parser.add_argument('--brands', type=int, default=40)
+    parser.add_argument('--categories', type=int, default=8)
+    parser.add_argument('--retailers', type=int, default=1)
+    parser.add_argument('--weeks', type=int, default=104)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = write_stackline_csv(args.path, brands=args.brands, categories=args.categories,
+                               retailers=args.retailers, weeks=args.weeks, seed=args.seed)
+    print(f"--- Saved {rows:,} synthetic rows to {args.path} ---")
@@ -0,0 +1,36 @@
+"""
+Shared fixtures. The modules live flat in the repository root, and the tools read their files from
+the working directory, so every test that needs data runs in its own directory with a synthetic
+stackline_sales.csv.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import brand_analysis_tools as bat
+from synthetic_stackline import generate_stackline_sales
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Runs the test in an empty directory with cold tool caches."""
+    monkeypatch.chdir(tmp_path)
+    bat.clear_cache()
+    yield tmp_path
+    bat.clear_cache()
+
+
+@pytest.fixture
+def sales_df():
+    """A small synthetic extract covering the default focus retailer, supercategory and owner."""
+    return generate_stackline_sales(brands=24, categories=6, weeks=80, seed=1)
+
+
+@pytest.fixture
+def sales_csv(workdir, sales_df):
+    """Writes sales_df as stackline_sales.csv in the test directory and returns it."""
+    sales_df.to_csv(bat.DATA_FILE, index=False)
+    return sales_df
@@ -0,0 +1,61 @@
+"""
+Offline stand-in for the Azure chat model, so the graph can run in tests (init_agents(ScriptedChatModel())).
+"""
+import time
+import asyncio
+from typing import Dict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    On the first call of an agent run it requests the agent's first bound tool, with tool_args[name]
+    as arguments (or none), when call_tools is set. Once a tool result is in the messages, or when
+    the agent has no tools, it answers: the Supervisor with `plan`, any other agent by echoing the last
+    human message. Each call sleeps `delay` seconds, or delays[key] when key occurs in the last human
+    message, and reports fixed token usage.
+    """
+    plan: str = "1. Investigate Brand 1."
+    tool_args: Dict[str, dict] = {}
+    call_tools: bool = True
+    delay: float = 0.0
+    delays: Dict[str, float] = {}
+
+    prompt_tokens: int = 100
+    completion_tokens: int = 20
+
+    @property
+    def _llm_type(self):
+        return 'scripted-fake'
+
+    @staticmethod
+    def _last_human(messages):
+        return next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), '')
+
+    def _delay_for(self, messages):
+        last = self._last_human(messages)
+        return next((seconds for key, seconds in self.delays.items() if key in last), self.delay)
+
+    def _reply(self, messages, tools):
+        usage = {'input_tokens': self.prompt_tokens, 'output_tokens': self.completion_tokens,
+                 'total_tokens': self.prompt_tokens + self.completion_tokens}
+        if self.call_tools and tools and not any(isinstance(m, ToolMessage) for m in messages):
+            name = tools[0]['function']['name']
+            message = AIMessage(content='', usage_metadata=usage,
+                                tool_calls=[{'name': name, 'args': self.tool_args.get(name, {}), 'id': f'call_{name}'}])
+        else:
+            system = next((m.content for m in messages if isinstance(m, SystemMessage)), '')
+            content = self.plan if 'You are a Supervisor' in system else f"Findings for: {self._last_human(messages)}"
+            message = AIMessage(content=content, usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        time.sleep(self._delay_for(messages))
+        return self._reply(messages, tools)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs):
+        await asyncio.sleep(self._delay_for(messages))
+        return self._reply(messages, tools)
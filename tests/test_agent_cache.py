@@ -0,0 +1,47 @@
+import os
+import time
+import json
+
+from agent_cache import AgentCache
+
+DAY = 86400
+
+
+def _backdate(cache, key, seconds):
+    """Makes the entry for key look as if it had been written (and last read) `seconds` ago."""
+    path = cache._path(key)
+    with open(path, encoding='utf-8') as f:
+        entry = json.load(f)
+    entry['created'] -= seconds
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+    written = time.time() - seconds
+    os.utime(path, (written, written))
+
+
+def test_entries_expire_after_max_age_even_when_read(tmp_path, monkeypatch):
+    cache = AgentCache(directory=str(tmp_path), max_age_days=1)
+    key = AgentCache.make_key('prompt', 'messages')
+    cache.put(key, 'answer')
+    _backdate(cache, key, 0.9 * DAY)
+
+    assert cache.get(key) == 'answer'
+    # Reading must not extend the entry's life.
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 0.2 * DAY)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_evicts_least_recently_read(tmp_path):
+    cache = AgentCache(directory=str(tmp_path), max_age_days=1)
+    keys = [AgentCache.make_key(i) for i in range(4)]
+    for age, key in zip([300, 200, 100], keys):
+        cache.put(key, 'x' * 1000)
+        _backdate(cache, key, age)
+    cache.max_bytes = 3.5 * os.path.getsize(cache._path(keys[0]))
+
+    assert cache.get(keys[0]) == 'x' * 1000
+    cache.put(keys[3], 'x' * 1000)
+
+    assert [os.path.exists(cache._path(key)) for key in keys] == [True, False, True, True]
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+import langraph_agentic_app as agentic_app
+from fake_chat import ScriptedChatModel
+
+
+@pytest.fixture
+def fake_agents(workdir, monkeypatch):
+    """Clears the agents and turns the agent cache off; returns init_agents to build them on a fake model."""
+    monkeypatch.setattr(agentic_app, 'agents', {})
+    monkeypatch.setattr(agentic_app.agent_cache, 'enabled', False)
+    return agentic_app.init_agents
+
+
+def test_parse_plan_tasks_expands_sub_bullets():
+    plan = """Here is the plan:
+1. Analyze Brand 1 in Pet Category 1.
+2) Investigate the key competitors:
+   - Brand 9 in Pet Category 1
+   * Brand 11 in Pet Category 3
+3. Review Brand 3, whose decline
+   started in L13.
+"""
+    assert agentic_app.parse_plan_tasks(plan) == [
+        "1. Analyze Brand 1 in Pet Category 1.",
+        "2. Investigate the key competitors: Brand 9 in Pet Category 1",
+        "2. Investigate the key competitors: Brand 11 in Pet Category 3",
+        "3. Review Brand 3, whose decline started in L13.",
+    ]
+
+
+def test_parse_plan_tasks_without_numbering():
+    assert agentic_app.parse_plan_tasks("  Look at every brand.\n- and the competitors\n") == \
+        ["Look at every brand.\n- and the competitors"]
+    assert agentic_app.parse_plan_tasks("   \n") == []
+
+
+def test_brand_analyst_merges_findings_in_plan_order(fake_agents):
+    # Earlier tasks answer last, so the analyst runs finish in reverse plan order.
+    fake_agents(ScriptedChatModel(call_tools=False, delays={'Brand A': 0.3, 'Brand B': 0.2, 'Brand C': 0.1}))
+    state = {
+        'messages': [HumanMessage(content="Begin the weekly performance analysis.")],
+        'category_health_summary': "Category is flat.",
+        'supervisor_plan': "1. Analyze Brand A.\n2. Compare competitors:\n   - Brand B\n   - Brand C",
+        'analyst_findings': "",
+    }
+
+    start = time.perf_counter()
+    state = asyncio.run(agentic_app.abrand_analyst_node(state, {}))
+    elapsed = time.perf_counter() - start
+
+    tasks = ["1. Analyze Brand A.", "2. Compare competitors: Brand B", "2. Compare competitors: Brand C"]
+    sections = state['analyst_findings'].split("## ")[1:]
+    assert [section.splitlines()[0] for section in sections] == tasks
+    for task, section in zip(tasks, sections):
+        assert f"Investigate only this task from the plan:\n{task}" in section
+    # The three runs overlap instead of taking 0.6s back to back.
+    assert elapsed < 0.5
+    with open("02_analyst_findings.md", encoding='utf-8') as f:
+        assert f.read() == f"# Brand Analyst Findings\n\n{state['analyst_findings']}"
+
+
+@pytest.mark.parametrize('value, enabled', [('TRUE', False), ('Yes', False), ('0', True)])
+def test_agent_cache_bypass_flag_is_case_insensitive(tmp_path, value, enabled):
+    # The flag is read at import time, so check it in a fresh interpreter.
+    env = dict(os.environ, AGENT_CACHE_BYPASS=value, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, '-c', 'import langraph_agentic_app as a; print(a.agent_cache.enabled)'],
+                            cwd=tmp_path, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.strip().splitlines()[-1] == str(enabled)
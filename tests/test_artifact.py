@@ -0,0 +1,38 @@
+import os
+
+import pandas as pd
+
+import brand_analysis_tools as bat
+
+
+def _build_artifact_from(rows):
+    """Builds the artifact from rows, then removes the CSV as on an agent host that only has the artifact."""
+    rows.to_csv(bat.DATA_FILE, index=False)
+    metadata = bat.build_analysis_artifact()
+    os.remove(bat.DATA_FILE)
+    return metadata
+
+
+def test_refreshed_artifact_is_picked_up(sales_df, workdir):
+    last_week = sales_df['Week Ending'].max()
+    _build_artifact_from(sales_df[sales_df['Week Ending'] < last_week])
+    fingerprint = bat.analysis_fingerprint()
+    health = bat.get_category_health.invoke({})
+    assert bat._get_analysis()['most_recent_date'] < pd.Timestamp(last_week)
+
+    # A later data drop is precomputed while this process keeps running.
+    metadata = _build_artifact_from(sales_df)
+
+    assert metadata['most_recent_date'] == last_week
+    assert bat.analysis_fingerprint() != fingerprint
+    assert bat._get_analysis()['most_recent_date'] == pd.Timestamp(last_week)
+    assert bat.get_category_health.invoke({}) != health
+
+
+def test_artifact_answers_like_the_source(sales_csv):
+    expected = [bat.get_category_health.invoke({}), bat.get_performance_and_contribution_summary.invoke({})]
+    bat.build_analysis_artifact()
+    bat.clear_cache()
+
+    assert 'metadata' in bat._get_analysis()
+    assert [bat.get_category_health.invoke({}), bat.get_performance_and_contribution_summary.invoke({})] == expected
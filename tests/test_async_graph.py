@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+import brand_analysis_tools as bat
+import langraph_agentic_app as agentic_app
+from fake_chat import ScriptedChatModel
+from run_metrics import RunMetrics
+
+LLM_DELAY = 0.2
+
+
+@pytest.fixture
+def fake_llm(sales_csv, monkeypatch):
+    """A fake model with a fixed latency per call, planning three analyst tasks; agents built on it, cache off."""
+    brand, category = bat._get_analysis_index()['focus_pairs'][0]
+    bat.clear_cache()
+    llm = ScriptedChatModel(delay=LLM_DELAY, plan=f"1. Analyze {brand} in {category}.\n2. Analyze competitor A.\n3. Analyze competitor B.",
+                            tool_args={'get_brand_and_competitor_diagnostics': {'brand': brand, 'category': category}})
+    monkeypatch.setattr(agentic_app, 'agents', {})
+    monkeypatch.setattr(agentic_app.agent_cache, 'enabled', False)
+    agentic_app.init_agents(llm)
+    return llm
+
+
+def _initial_state():
+    return {"messages": [HumanMessage(content="Begin the weekly performance analysis.")]}
+
+
+def test_async_run_is_faster_than_its_stages(fake_llm):
+    metrics = RunMetrics()
+    start = time.perf_counter()
+    final_state = asyncio.run(agentic_app.arun_workflow(_initial_state(), config={"callbacks": [metrics]}))
+    wall = time.perf_counter() - start
+
+    nodes = metrics.summary()['nodes'].values()
+    stages = sum(node['llm_s'] + node['tool_s'] for node in nodes)
+    # 11 LLM calls (two per tool-using agent run, one for the final report) of LLM_DELAY each.
+    assert sum(node['llm_calls'] for node in nodes) == 11
+    assert wall < stages
+    assert final_state['messages'][-1].name == "FinalReportAgent"
+
+
+def test_sync_invoke_matches_async_run(fake_llm):
+    async_state = asyncio.run(agentic_app.arun_workflow(_initial_state()))
+    bat.clear_cache()
+    sync_state = agentic_app.app.invoke(_initial_state())
+
+    assert sync_state['analyst_findings'] == async_state['analyst_findings']
+    assert sync_state['messages'][-1].content == async_state['messages'][-1].content
+    assert len(sync_state['analyst_findings'].split("## ")) == 4
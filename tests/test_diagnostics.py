@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import brand_analysis_tools as bat
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_bulk_diagnostics_match_single_brand_calls(sales_csv, monkeypatch, compact):
+    monkeypatch.setattr(bat, 'COMPACT_TOOL_OUTPUT', compact)
+    pairs = bat._get_analysis_index()['focus_pairs']
+    assert pairs
+    bulk = json.loads(bat.get_all_focus_brand_diagnostics.invoke({}))
+    singles = [json.loads(bat.get_brand_and_competitor_diagnostics.invoke({'brand': b, 'category': c})) for b, c in pairs]
+
+    if not compact:
+        assert [(d['Brand'], d['Category']) for d in bulk['focus_brand_diagnostics']] == pairs
+        for report, single, (_, category) in zip(bulk['focus_brand_diagnostics'], singles, pairs):
+            assert {key: report[key] for key in ['Price_Volume_Decomposition', 'Causal_Factors']} == single['focus_brand_diagnostics']
+            assert bulk['competitor_details'][category] == single['competitor_details']
+        return
+
+    # Compact tables are long-format, keyed by Brand and PCB_Category.
+    for table in ['price_volume_decomposition', 'causal_factors']:
+        rows = [row for single in singles for row in single[table]['rows']]
+        assert [row[2:] for row in bulk[table]['rows']] == rows
+        assert bulk[table]['columns'][2:] == singles[0][table]['columns']
+        assert {tuple(row[:2]) for row in bulk[table]['rows']} == set(pairs)
+    for single, (_, category) in zip(singles, pairs):
+        competitors = [row[1:] for row in bulk['competitor_details']['rows'] if row[0] == category]
+        assert competitors == single['competitor_details']['rows']
+
+
+def test_make_tools_on_a_filtered_frame(sales_csv):
+    analysis_df = bat._get_brand_level_analysis_df()
+    filtered = analysis_df[analysis_df['PCB_Category'] != 'Pet Category 1']
+    tools = {tool.name: tool for tool in bat.make_tools(filtered, compact=False)}
+    expected = {tool.name: tool for tool in bat.make_tools(filtered.reset_index(drop=True), compact=False)}
+
+    assert json.loads(tools['get_all_focus_brand_diagnostics'].invoke({})) == \
+        json.loads(expected['get_all_focus_brand_diagnostics'].invoke({}))
+    brand, category = filtered[filtered['Brand Owner'].isin(bat.FOCUS_BRAND_OWNER)][['Brand', 'PCB_Category']].iloc[0]
+    report = json.loads(tools['get_brand_and_competitor_diagnostics'].invoke({'brand': brand, 'category': category}))
+    assert report == json.loads(expected['get_brand_and_competitor_diagnostics'].invoke({'brand': brand, 'category': category}))
+    assert report['focus_brand_diagnostics']
+
+
+def test_competitor_top_n_is_read_at_call_time(sales_csv, monkeypatch):
+    pairs = bat._get_analysis_index()['focus_pairs']
+    monkeypatch.setattr(bat, 'COMPACT_TOOL_OUTPUT', False)
+    monkeypatch.setattr(bat, 'COMPETITOR_TOP_N', 2)
+    brand, category = pairs[0]
+    report = json.loads(bat.get_brand_and_competitor_diagnostics.invoke({'brand': brand, 'category': category}))
+    assert len(report['competitor_details']) == 2
+    assert all(len(rows) <= 2 for rows in bat._build_analysis_index(bat._get_brand_level_analysis_df())['competitors'].values())
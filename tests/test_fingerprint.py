@@ -0,0 +1,16 @@
+import pytest
+
+import brand_analysis_tools as bat
+
+
+@pytest.mark.parametrize('name, value', [
+    ('COMPACT_TOOL_OUTPUT', True),
+    ('COMPACT_SIG_FIGS', 2),
+    ('COMPACT_ROW_LIMITS', {**bat.COMPACT_ROW_LIMITS, 'competitor_details': 3}),
+    ('FOCUS_BRAND_OWNER', ['OWNER 1']),
+    ('MEMORY_OPTIMIZED', True),
+])
+def test_payload_and_focus_settings_change_the_fingerprint(sales_csv, monkeypatch, name, value):
+    before = bat.analysis_fingerprint()
+    monkeypatch.setattr(bat, name, value)
+    assert bat.analysis_fingerprint() != before
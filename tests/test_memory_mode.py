@@ -0,0 +1,43 @@
+import json
+import math
+
+import brand_analysis_tools as bat
+
+
+def _close(a, b):
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_close(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return len(a) == len(b) and all(map(_close, a, b))
+    if isinstance(a, float):
+        return math.isclose(a, b, rel_tol=1e-4, abs_tol=1e-2)
+    return a == b
+
+
+def _tool_outputs():
+    bat.clear_cache()
+    pairs = bat._get_analysis_index()['focus_pairs']
+    return [json.loads(output) for output in
+            [bat.get_category_health.invoke({}), bat.get_performance_and_contribution_summary.invoke({})]
+            + [bat.get_brand_and_competitor_diagnostics.invoke({'brand': b, 'category': c}) for b, c in pairs]]
+
+
+def test_memory_optimized_frame_is_float32_and_answers_the_same(sales_csv, monkeypatch):
+    expected = _tool_outputs()
+    monkeypatch.setattr(bat, 'MEMORY_OPTIMIZED', True)
+    outputs = _tool_outputs()
+
+    analysis_df = bat._get_brand_level_analysis_df()
+    assert (analysis_df.select_dtypes('number').dtypes == 'float32').all()
+    assert set(bat.TOOL_DERIVED_COLUMNS) <= set(analysis_df.columns)
+    # Formatted strings may differ in the last rounded digit; numbers only by float32 rounding.
+    assert _close(outputs[:2], expected[:2])
+    def competitors(diagnostics):
+        return [[entry['Brand'] for entry in o['competitor_details']] for o in diagnostics]
+    assert competitors(outputs[2:]) == competitors(expected[2:])
+
+
+def test_flipping_memory_mode_rebuilds_the_cached_frame(sales_csv, monkeypatch):
+    assert (bat._get_brand_level_analysis_df().select_dtypes('number').dtypes == 'float64').any()
+    monkeypatch.setattr(bat, 'MEMORY_OPTIMIZED', True)
+    assert (bat._get_brand_level_analysis_df().select_dtypes('number').dtypes == 'float32').all()
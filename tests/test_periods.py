@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import brand_analysis_tools as bat
+
+
+def _weeks(df):
+    return pd.to_datetime(df['Week Ending'])
+
+
+def _rows_with_gaps(df):
+    """Prepared rows with brands that miss whole periods and with missing mean metrics."""
+    last = _weeks(df).max()
+    # Brand 1 stopped selling four weeks ago, so its L1 and L4 periods hold no weeks.
+    df = df[~((df['Brand'] == 'Brand 1') & (_weeks(df) > last - pd.Timedelta(weeks=4)))]
+    # Brand 3 only sold around the year-ago weeks, so only its Y periods are populated.
+    year_ago = (_weeks(df) >= last - pd.Timedelta(weeks=77)) & (_weeks(df) <= last - pd.Timedelta(weeks=52))
+    df = df[(df['Brand'] != 'Brand 3') | year_ago].copy()
+    # Mean metrics are missing on a few rows, and on every row of Brand 5 in the latest week
+    # (its L1 means have no values at all).
+    rng = np.random.default_rng(7)
+    for col in bat.MEAN_COLS:
+        df.loc[rng.random(len(df)) < 0.05, col] = np.nan
+        df.loc[(df['Brand'] == 'Brand 5') & (_weeks(df) == last), col] = np.nan
+    return bat._prepare_rows(df)
+
+
+def test_engine_matches_reference(sales_df):
+    df = _rows_with_gaps(sales_df)
+    most_recent_date = df['Week Ending'].max()
+
+    engine = bat._periods_from_weekly(bat._weekly_brand_aggregates(df), most_recent_date)
+    reference = bat._periods_by_filter(df, most_recent_date)
+
+    pd.testing.assert_frame_equal(engine, reference, check_exact=False)
+    by_brand = engine.groupby(level='Brand')
+    assert (by_brand.get_group('Brand 1')['Retail_Sales_L4'] == 0).all()
+    assert (by_brand.get_group('Brand 3')['Retail_Sales_L13'] == 0).all()
+    assert (by_brand.get_group('Brand 3')['Retail_Sales_Y13'] > 0).all()
+    assert (by_brand.get_group('Brand 5')['Retail_Price_L1'] == 0).all()
+
+
+def test_engine_matches_reference_for_older_window(sales_df):
+    # Ending the windows mid-history leaves weeks after most_recent_date that belong to no period.
+    df = bat._prepare_rows(sales_df)
+    most_recent_date = df['Week Ending'].max() - pd.Timedelta(weeks=3)
+
+    engine = bat._periods_from_weekly(bat._weekly_brand_aggregates(df), most_recent_date)
+    reference = bat._periods_by_filter(df, most_recent_date)
+
+    pd.testing.assert_frame_equal(engine, reference, check_exact=False)
@@ -0,0 +1,53 @@
+import json
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+import brand_analysis_tools as bat
+import langraph_agentic_app as agentic_app
+from fake_chat import ScriptedChatModel
+from run_metrics import RunMetrics
+
+NODES = ['CategoryHealth', 'SupervisorPlanning', 'BrandAnalyst', 'FinalReporting']
+
+
+def test_graph_run_metrics(sales_csv, monkeypatch):
+    brand, category = bat._get_analysis_index()['focus_pairs'][0]
+    llm = ScriptedChatModel(plan=f"1. Analyze {brand} in {category}.\n2. Analyze its key competitor.",
+                            tool_args={'get_brand_and_competitor_diagnostics': {'brand': brand, 'category': category}})
+    monkeypatch.setattr(agentic_app, 'agents', {})
+    monkeypatch.setattr(agentic_app.agent_cache, 'enabled', False)
+    agentic_app.init_agents(llm)
+
+    metrics = RunMetrics()
+    asyncio.run(agentic_app.arun_workflow({"messages": [HumanMessage(content="Begin the weekly performance analysis.")]},
+                                          config={"callbacks": [metrics]}))
+    metrics.write_jsonl("04_run_metrics.jsonl")
+
+    with open("04_run_metrics.jsonl", encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    *events, summary = lines
+
+    assert [e['node'] for e in events if e['event'] == 'node'] == NODES
+    assert all(e['status'] == 'ok' and e['seconds'] >= 0 for e in events)
+
+    # One tool call and one answer per agent run; the final report agent has no tools.
+    llm_calls = [e['node'] for e in events if e['event'] == 'llm']
+    assert {node: llm_calls.count(node) for node in NODES} == \
+        {'CategoryHealth': 2, 'SupervisorPlanning': 2, 'BrandAnalyst': 4, 'FinalReporting': 1}
+    assert all(e['prompt_tokens'] == llm.prompt_tokens and e['completion_tokens'] == llm.completion_tokens
+               for e in events if e['event'] == 'llm')
+
+    tools = [(e['node'], e['tool']) for e in events if e['event'] == 'tool']
+    assert sorted(tools) == sorted([('CategoryHealth', 'get_category_health'),
+                                    ('SupervisorPlanning', 'get_performance_and_contribution_summary'),
+                                    ('BrandAnalyst', 'get_brand_and_competitor_diagnostics'),
+                                    ('BrandAnalyst', 'get_brand_and_competitor_diagnostics')])
+    assert all(e['output_chars'] > 2 and e['input_chars'] > 0 for e in events if e['event'] == 'tool')
+
+    assert summary['event'] == 'summary'
+    analyst = summary['nodes']['BrandAnalyst']
+    assert analyst['llm_calls'] == 4 and analyst['tool_calls'] == 2
+    assert analyst['prompt_tokens'] == 4 * llm.prompt_tokens
+    assert analyst['completion_tokens'] == 4 * llm.completion_tokens
+    assert summary['total_wall_s'] >= sum(summary['nodes'][node]['wall_s'] for node in NODES) * 0.99
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+import brand_analysis_tools as bat
+
+
+def _in_memory_frame():
+    bat.clear_cache()
+    return bat._build_brand_level_analysis_df(bat._load_and_prepare_data())
+
+
+@pytest.mark.parametrize('chunk_rows, shuffle', [(1000, False), (37, False), (250, True)])
+def test_streaming_matches_in_memory(sales_df, workdir, chunk_rows, shuffle):
+    # 37 rows per chunk splits every week across chunks; shuffled rows spread each week over the whole file.
+    if shuffle:
+        sales_df = sales_df.sample(frac=1, random_state=3)
+    sales_df.to_csv(bat.DATA_FILE, index=False)
+    assert (sales_df['Week Ending'].value_counts() % chunk_rows != 0).any()
+
+    streamed, most_recent_date = bat._build_brand_level_analysis_df_streaming(bat.DATA_FILE, chunk_rows)
+
+    pd.testing.assert_frame_equal(streamed, _in_memory_frame(), check_exact=False)
+    assert most_recent_date == pd.Timestamp(sales_df['Week Ending'].max())
+
+
+def test_streaming_tools_match_in_memory(sales_csv, monkeypatch):
+    expected = [bat.get_category_health.invoke({}), bat.get_performance_and_contribution_summary.invoke({})]
+    monkeypatch.setattr(bat, 'STREAM_CHUNK_ROWS', 500)
+    bat.clear_cache()
+    assert [bat.get_category_health.invoke({}), bat.get_performance_and_contribution_summary.invoke({})] == expected
+
+
+def test_streaming_with_weekly_store(sales_csv):
+    expected = _in_memory_frame()
+    rows = bat._prepare_rows(sales_csv)
+    store = bat.build_weekly_store(rows[rows['Week Ending'] <= rows['Week Ending'].max() - pd.Timedelta(weeks=3)])
+
+    streamed, most_recent_date = bat._build_brand_level_analysis_df_streaming(bat.DATA_FILE, 300, store)
+
+    pd.testing.assert_frame_equal(streamed, expected, check_exact=False)
+    assert most_recent_date == rows['Week Ending'].max()
@@ -0,0 +1,73 @@
+import os
+
+import pandas as pd
+import pytest
+
+import brand_analysis_tools as bat
+
+
+def _build_store_without_last_weeks(raw, weeks=2):
+    rows = bat._prepare_rows(raw)
+    cutoff = rows['Week Ending'].max() - pd.Timedelta(weeks=weeks)
+    return bat.build_weekly_store(rows[rows['Week Ending'] <= cutoff])
+
+
+def test_tool_calls_roll_the_store_in_memory(sales_csv):
+    expected = bat._get_brand_level_analysis_df()
+    store = _build_store_without_last_weeks(sales_csv)
+    with open(bat.WEEKLY_STORE_FILE, 'rb') as f:
+        persisted = f.read()
+    mtime = os.stat(bat.WEEKLY_STORE_FILE).st_mtime_ns
+
+    bat.clear_cache()
+    rolled = bat._get_brand_level_analysis_df()
+    bat.get_category_health.invoke({})
+
+    pd.testing.assert_frame_equal(rolled, expected, check_exact=False)
+    assert bat._get_analysis()['most_recent_date'] == pd.Timestamp(sales_csv['Week Ending'].max())
+    # Reading through the store must not rewrite it.
+    assert os.stat(bat.WEEKLY_STORE_FILE).st_mtime_ns == mtime
+    with open(bat.WEEKLY_STORE_FILE, 'rb') as f:
+        assert f.read() == persisted
+    assert bat._load_weekly_store()['most_recent_date'] == store['most_recent_date']
+
+
+def test_ingest_weeks_persists_the_new_weeks(sales_csv):
+    _build_store_without_last_weeks(sales_csv)
+    bat.ingest_weeks(sales_csv)
+
+    store = bat._load_weekly_store()
+    rows = bat._prepare_rows(sales_csv)
+    assert store['most_recent_date'] == rows['Week Ending'].max()
+    pd.testing.assert_frame_equal(bat._periods_from_totals(store['totals']),
+                                  bat._periods_from_weekly(bat._weekly_brand_aggregates(rows), store['most_recent_date']),
+                                  check_exact=False)
+
+
+def test_ingest_weeks_without_store_starts_from_full_history(sales_csv):
+    # Only the last week is ingested, but the new store must cover the whole history on disk.
+    expected = bat._get_brand_level_analysis_df()
+    last_week = sales_csv[sales_csv['Week Ending'] == sales_csv['Week Ending'].max()]
+    store = bat.ingest_weeks(last_week)
+
+    assert len(store['weekly'].index.get_level_values('Week Ending').unique()) > 1
+    bat.clear_cache()
+    pd.testing.assert_frame_equal(bat._get_brand_level_analysis_df(), expected, check_exact=False)
+
+
+def test_ingest_weeks_folds_rows_newer_than_the_history(sales_df, workdir):
+    rows = bat._prepare_rows(sales_df)
+    last = rows['Week Ending'].max()
+    sales_df[pd.to_datetime(sales_df['Week Ending']) < last].to_csv(bat.DATA_FILE, index=False)
+    store = bat.ingest_weeks(sales_df[pd.to_datetime(sales_df['Week Ending']) == last])
+
+    assert store['most_recent_date'] == last
+    pd.testing.assert_frame_equal(bat._periods_from_totals(store['totals']),
+                                  bat._periods_from_weekly(bat._weekly_brand_aggregates(rows), last),
+                                  check_exact=False)
+
+
+def test_ingest_weeks_without_store_or_history_raises(sales_df, workdir):
+    with pytest.raises(ValueError):
+        bat.ingest_weeks(sales_df)
+    assert not os.path.exists(bat.WEEKLY_STORE_FILE)